@@ -1,12 +1,12 @@
 # Kitty search from https://github.com/trygveaa/kitty-kitten-search
 # License: GPLv3
 
-import json
+import os
 import re
-import subprocess
+import time
+from asyncio import TimerHandle
 from gettext import gettext as _
 from pathlib import Path
-from subprocess import PIPE, run
 
 from kittens.tui.handler import Handler
 from kittens.tui.line_edit import LineEdit
@@ -22,6 +22,22 @@ from kitty.config import cached_values_for
 from kitty.key_encoding import EventType
 from kitty.typing_compat import KeyEventType, ScreenSize
 
+from search_index import (
+    SCOPE_TIERS,
+    BUDGET_SAMPLE_CHARS,
+    TIER_ORIGIN,
+    Match,
+    MatchIndex,
+    PatternTimeout,
+    Query,
+    Scrollback,
+    build_index,
+)
+from search_history import History, HistoryCursor
+from search_topology import Topology, cached_topology, store_topology
+from search_rc import RemoteControl, match_windows
+from search_timing import Timings, timed
+
 NON_SPACE_PATTERN = re.compile(r"\S+")
 SPACE_PATTERN = re.compile(r"\s+")
 SPACE_PATTERN_END = re.compile(r"\s+$")
@@ -33,10 +49,6 @@ NON_ALPHANUM_PATTERN_START = re.compile(r"^[^\w\d]+")
 ALPHANUM_PATTERN = re.compile(r"[\w\d]+")
 
 
-def call_remote_control(args: list[str]) -> None:
-    subprocess.run(["kitty", "@", *args], capture_output=True)
-
-
 def reindex(
     text: str, pattern: re.Pattern[str], right: bool = False
 ) -> tuple[int, int]:
@@ -56,14 +68,45 @@ def reindex(
 
 SCROLLMARK_FILE = Path(__file__).parent.absolute() / "scroll_mark.py"
 
+# tab cycles through the modes, each with its own prompt
+PROMPTS = {"text": "=> ", "regex": "~> ", "fuzzy": "?> "}
+
+# idle time after the last keystroke before markers are sent, <= 0 marks on every key
+MARK_DELAY = 0.08
+# time a regex may take per BUDGET_SAMPLE_CHARS of searched text before it is refused
+REGEX_BUDGET = 0.05
+
 
 class Search(Handler):
     def __init__(
-        self, cached_values: dict[str, str], window_ids: list[int], error: str = ""
+        self,
+        cached_values: dict[str, str],
+        window_ids: list[int],
+        error: str = "",
+        rc: RemoteControl | None = None,
+        mark_delay: float = MARK_DELAY,
+        tiers: dict[int, int] | None = None,
+        topology: Topology | None = None,
+        regex_budget: float = REGEX_BUDGET,
+        timings: Timings | None = None,
     ) -> None:
+        self.timings = timings or Timings()
         self.cached_values = cached_values
         self.window_ids = window_ids
+        self.tiers = tiers or {}
+        self.topology = topology
+        self.regex_budget = regex_budget
+        self.slow_patterns: set[tuple[str, int]] = set()
+        self.query_status = ""
         self.error = error
+        self.rc = rc or RemoteControl()
+        self.mark_delay = mark_delay
+        self.pending_mark: TimerHandle | None = None
+        self.marked: tuple[str, str] | None = None
+        self.index: MatchIndex | None = None
+        self.index_loaded = False
+        self.history = History.from_cached(cached_values.get("history"))
+        self.history_cursor: HistoryCursor | None = None
         self.line_edit = LineEdit()
         last_search = cached_values.get("last_search", "")
         self.line_edit.add_text(last_search)
@@ -73,7 +116,7 @@ class Search(Handler):
         self.mark()
 
     def update_prompt(self) -> None:
-        self.prompt = "~> " if self.mode == "regex" else "=> "
+        self.prompt = PROMPTS.get(self.mode, PROMPTS["text"])
 
     def init_terminal_state(self) -> None:
         self.write(set_line_wrapping(False))
@@ -82,7 +125,9 @@ class Search(Handler):
     def initialize(self) -> None:
         self.init_terminal_state()
         self.draw_screen()
+        self.timings.launched()
 
+    @timed("draw")
     def draw_screen(self) -> None:
         self.write(clear_screen())
         if self.window_ids:
@@ -91,21 +136,61 @@ class Search(Handler):
                 self.line_edit.current_input = styled(input_text, reverse=True)
             self.line_edit.write(self.write, self.prompt)
             self.line_edit.current_input = input_text
+            self.draw_status(len(self.prompt) + len(input_text))
         if self.error:
             with cursor(self.write):
                 self.print("")
                 for l in self.error.split("\n"):
                     self.print(l)
 
+    def draw_status(self, used: int) -> None:
+        status = self.status_text()
+        col = self.screen_size.cols - len(status)
+        if status and col > used + 1:
+            with cursor(self.write):
+                self.write(f"\r\x1b[{col + 1}G")
+                self.write(styled(status, dim=True))
+
+    def status_text(self) -> str:
+        parts = [self.index.status() if self.index is not None else "", self.query_status]
+        if self.history_cursor is not None and self.history_cursor.shown == self.line_edit.current_input:
+            parts.append(self.history_cursor.status())
+        return "  ".join(part for part in parts if part)
+
     def refresh(self) -> None:
         self.draw_screen()
+        self.schedule_mark()
+
+    def schedule_mark(self) -> None:
+        """Coalesces bursts of keystrokes into one marker update, the prompt is redrawn right away"""
+        self.timings.keystroke()
+        self.cancel_mark()
+        if self.mark_delay <= 0:
+            self.flush_mark()
+            return
+        try:
+            loop = self.asyncio_loop
+        except AttributeError:  # not running inside Loop yet
+            self.mark()
+            self.timings.applied()
+            return
+        self.pending_mark = loop.call_later(self.mark_delay, self.flush_mark)
+
+    def cancel_mark(self) -> None:
+        if self.pending_mark is not None:
+            self.pending_mark.cancel()
+            self.pending_mark = None
+
+    def flush_mark(self) -> None:
+        """Sends a scheduled marker update now (ex. before scrolling to it)"""
+        self.cancel_mark()
         self.mark()
+        self.timings.applied()
+        self.draw_screen()  # match counts
 
     def switch_mode(self) -> None:
-        if self.mode == "regex":
-            self.mode = "text"
-        else:
-            self.mode = "regex"
+        modes = list(PROMPTS)
+        self.mode = modes[(modes.index(self.mode) + 1) % len(modes)] if self.mode in modes else "text"
         self.cached_values["mode"] = self.mode
         self.update_prompt()
 
@@ -116,7 +201,34 @@ class Search(Handler):
         self.line_edit.on_text(text, in_bracketed_paste)
         self.refresh()
 
+    def recall(self, delta: int, by_frequency: bool = False) -> None:
+        """
+        Replaces the input with the previous (1) / next (-1) history entry
+        starting with what was typed, ranked by recency or by use
+        """
+        text = "" if self.text_marked else self.line_edit.current_input
+        cursor = self.history_cursor
+        if cursor is None or cursor.shown != text or cursor.by_frequency != by_frequency:
+            # edited since the last recall (or first one): browse from the current input
+            cursor = HistoryCursor(text, self.history.lookup(text, by_frequency), by_frequency)
+            self.history_cursor = cursor
+        self.text_marked = False
+        self.line_edit.clear()
+        self.line_edit.add_text(cursor.move(delta))
+        self.refresh()
+
     def on_key(self, key_event: KeyEventType) -> None:
+        # up/down walk the matches, the history has its own keys
+        if key_event.matches("ctrl+p"):
+            self.recall(1)
+            return
+        if key_event.matches("ctrl+n"):
+            self.recall(-1)
+            return
+        if key_event.matches("ctrl+r"):
+            self.recall(1, by_frequency=True)
+            return
+
         if (
             self.text_marked
             and key_event.type == EventType.PRESS
@@ -256,11 +368,9 @@ class Search(Handler):
             self.switch_mode()
             self.refresh()
         elif key_event.matches("up") or key_event.matches("f3"):
-            for match_arg in self.match_args():
-                call_remote_control(["kitten", match_arg, str(SCROLLMARK_FILE)])
+            self.step(-1)
         elif key_event.matches("down") or key_event.matches("shift+f3"):
-            for match_arg in self.match_args():
-                call_remote_control(["kitten", match_arg, str(SCROLLMARK_FILE), "next"])
+            self.step(1)
         elif key_event.matches("enter"):
             self.quit(0)
         elif key_event.matches("esc"):
@@ -278,40 +388,201 @@ class Search(Handler):
     def match_args(self) -> list[str]:
         return [f"--match=id:{window_id}" for window_id in self.window_ids]
 
+    def match_all_arg(self) -> str:
+        return f"--match={match_windows(self.window_ids)}"
+
+    def load_index(self) -> MatchIndex | None:
+        """Fetches the text of every window once, None if kitty did not return it"""
+        if self.index_loaded:
+            return self.index
+        self.index_loaded = True
+
+        commands = [
+            ["get-text", f"--match=id:{window_id}", "--extent=all", "--add-wrap-markers"]
+            for window_id in self.window_ids
+        ]
+        if self.topology is None:  # window heights, same round trip
+            commands.insert(0, ["ls"])
+        with self.timings.measure("get-text"):
+            texts = self.rc.send_many(commands)
+        if self.topology is None:
+            self.topology = store_topology(self.cached_values, texts.pop(0))
+
+        if any(text is not None for text in texts):
+            with self.timings.measure("index"):
+                self.index = build_index(
+                    [
+                        Scrollback(
+                            window_id,
+                            text or "",
+                            self.topology.rows(window_id) if self.topology else 0,
+                            self.tiers.get(window_id, TIER_ORIGIN),
+                        )
+                        for window_id, text in zip(self.window_ids, texts)
+                    ]
+                )
+        return self.index
+
+    def update_index(self, query: Query | None) -> bool:
+        """
+        False if a regex scan of the searched windows ran over the budget,
+        the pattern is then refused for the rest of the session
+        """
+        index = self.load_index() if query is not None else self.index
+        if index is None:
+            return True
+        start = time.perf_counter()
+        try:
+            index.update(query, self.regex_budget)
+        except PatternTimeout:
+            self.slow_patterns.add((query.pattern.pattern, query.pattern.flags))
+            self.query_status = self.too_slow_status()
+            return False
+        if query is not None and query.mode != "fuzzy" and not query.literal:
+            self.query_status = f"regex {(time.perf_counter() - start) * 1000:.1f} ms"
+        return True
+
+    def too_slow_status(self) -> str:
+        return f"regex too slow (>{self.regex_budget * 1000:.0f} ms per {BUDGET_SAMPLE_CHARS // 1000}k chars)"
+
+    def make_query(self, text: str) -> Query | None:
+        """
+        Compiles the input locally, None (with the reason in the status line)
+        for an invalid regex or one already refused by the budget
+        """
+        self.query_status = ""
+        try:
+            query = Query(self.mode, text)
+        except re.error:  # incomplete regex while typing
+            self.query_status = "invalid regex"
+            return None
+        if query.literal:
+            return query
+        if query.mode == "fuzzy":
+            if self.load_index() is None:
+                self.query_status = "fuzzy needs the window text"
+                return None
+            return query
+
+        if (query.pattern.pattern, query.pattern.flags) in self.slow_patterns:
+            self.query_status = self.too_slow_status()
+            return None
+        return query
+
+    @timed("step")
+    def step(self, delta: int) -> None:
+        """Scrolls to the previous (-1) / next (1) match"""
+        if self.pending_mark is not None:
+            self.flush_mark()
+        if self.index is None:  # no window text, let kitty walk its marks
+            with self.rc.batch():
+                for match_arg in self.match_args():
+                    args = ["kitten", match_arg, str(SCROLLMARK_FILE)]
+                    self.rc.send(args + (["next"] if delta > 0 else []))
+            return
+        match = self.index.step(delta)
+        if match is not None:
+            self.jump(match)
+            self.draw_screen()
+
+    def jump(self, match: Match) -> None:
+        """Scrolls the match's window so the match ends up in the middle"""
+        rows = self.index.scrollbacks[match.window_id].rows
+        offset = max(match.line - rows // 2, 0)
+        match_arg = f"--match=id:{match.window_id}"
+        with self.rc.batch():
+            self.rc.send(["scroll-window", match_arg, "start"])
+            if offset:
+                self.rc.send(["scroll-window", match_arg, f"{offset}l"])
+
+    @timed("mark")
     def mark(self) -> None:
         if not self.window_ids:
             return
         text = self.line_edit.current_input
-        if text:
-            match_case = "i" if text.islower() else ""
-            match_type = match_case + self.mode
-            for match_arg in self.match_args():
-                try:
-                    call_remote_control(
-                        ["create-marker", match_arg, match_type, "1", text]
-                    )
-                except SystemExit:
-                    self.remove_mark()
+        match_case = "i" if text.islower() else ""
+        match_type = match_case + self.mode
+        if text and self.marked == (match_type, text):  # cursor movement etc.
+            return
+        query = self.make_query(text) if text else None
+        if query is None:
+            if not text:
+                self.query_status = ""
+            self.remove_mark()
+            self.update_index(None)
+            return
+
+        if query.mode == "fuzzy":
+            # kitty only gets to mark the best lines, so rank them first
+            self.update_index(query)
+            pattern = self.index.fuzzy_pattern()
+            marker = ["regex", "1", pattern] if pattern else None
+        elif not query.literal:
+            # kitty only gets a regex the budgeted scan of every window finished
+            if not self.update_index(query):
+                self.remove_mark()
+                return
+            marker = [match_type, "1", text]
+        else:
+            marker = [match_type, "1", text]
+        if marker is not None:
+            with self.timings.measure("rc"):
+                self.rc.send(["create-marker", self.match_all_arg(), *marker])
+            self.marked = (match_type, text)
         else:
             self.remove_mark()
+        if query.literal:
+            self.update_index(query)
 
     def remove_mark(self) -> None:
-        for match_arg in self.match_args():
-            call_remote_control(["remove-marker", match_arg])
+        self.rc.send(["remove-marker", self.match_all_arg()])
+        self.marked = None
 
     def quit(self, return_code: int) -> None:
+        self.cancel_mark()
         self.cached_values["last_search"] = self.line_edit.current_input
-        self.remove_mark()
-        if return_code:
-            for match_arg in self.match_args():
-                call_remote_control(["scroll-window", match_arg, "end"])
+        self.history.record(self.line_edit.current_input)
+        self.cached_values["history"] = self.history.to_cached()
+        with self.rc.batch():
+            self.remove_mark()
+            if return_code:
+                self.rc.send(["scroll-window", self.match_all_arg(), "end"])
+            elif self.index is not None and self.index.current is not None:
+                match = self.index.match_at(self.index.current)
+                if match.window_id != self.window_ids[0]:
+                    self.rc.send(["focus-window", f"--match=id:{match.window_id}"])
+        if self.index is not None:
+            self.index.close()
+        self.rc.close()
+        self.timings.dump()
         self.quit_loop(return_code)
 
 
+def parse_ms(args: list[str], option: str, default: float) -> float:
+    """--option=MS (kitten argument) in seconds, falls back to 'default'"""
+    for arg in args:
+        if arg.startswith(f"{option}="):
+            try:
+                return int(arg.split("=", 1)[1]) / 1000
+            except ValueError:
+                break
+    return default
+
+
+def parse_scope(args: list[str]) -> str | None:
+    """--scope=tab|os-window|all, --all-windows is the same as --scope=tab"""
+    for arg in args:
+        if arg == "--all-windows":
+            return "tab"
+        if arg.startswith("--scope="):
+            return arg.split("=", 1)[1]
+    return None
+
+
 def main(args: list[str]) -> None:
-    call_remote_control(
-        ["resize-window", "--self", "--axis=vertical", "--increment", "-100"]
-    )
+    timings = Timings()  # launch latency counts from here
+    rc = RemoteControl()
+    rc.send(["resize-window", "--self", "--axis=vertical", "--increment", "-100"])
 
     error = ""
     if len(args) < 2 or not args[1].isdigit():
@@ -319,23 +590,35 @@ def main(args: list[str]) -> None:
 
     window_id = int(args[1])
     window_ids = [window_id]
-    if len(args) > 2 and args[2] == "--all-windows":
-        ls_output = run(["kitty", "@", "ls"], stdout=PIPE)
-        ls_json = json.loads(ls_output.stdout.decode())
-        current_tab = None
-        for os_window in ls_json:
-            for tab in os_window["tabs"]:
-                for kitty_window in tab["windows"]:
-                    if kitty_window["id"] == window_id:
-                        current_tab = tab
-        if current_tab:
-            window_ids = [
-                w["id"] for w in current_tab["windows"] if not w["is_focused"]
-            ]
-        else:
-            error = "Error: Could not find the window id provided."
+    own_id = os.environ.get("KITTY_WINDOW_ID", "")
+    own_id = int(own_id) if own_id.isdigit() else None
+    tiers = None
+    scope = parse_scope(args[2:])
+    if scope is not None and scope not in SCOPE_TIERS:
+        error = f"Error: --scope must be one of {', '.join(SCOPE_TIERS)}."
+        scope = None
 
     loop = Loop()
     with cached_values_for("search") as cached_values:
-        handler = Search(cached_values, window_ids, error)
+        topology = cached_topology(cached_values, window_id, own_id)
+        if topology is None and scope is not None:
+            topology = store_topology(cached_values, rc.send(["ls"], response=True))
+        if scope is not None:
+            tiers = topology.scope_windows(window_id, scope, own_id) if topology else None
+            if tiers is not None:
+                window_ids = list(tiers)
+            else:
+                error = "Error: Could not find the window id provided."
+
+        handler = Search(
+            cached_values,
+            window_ids,
+            error,
+            rc,
+            mark_delay=parse_ms(args[2:], "--mark-delay", MARK_DELAY),
+            tiers=tiers,
+            topology=topology,
+            regex_budget=parse_ms(args[2:], "--regex-budget", REGEX_BUDGET),
+            timings=timings,
+        )
         loop.loop(handler)
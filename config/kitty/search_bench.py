@@ -0,0 +1,120 @@
+"""
+Headless benchmark of the search kitten
+Drives Search with a fake `kitty @` and synthetic scrollbacks, kitty itself
+is not involved. Run from the kitty config dir:
+kitty +launch search_bench.py [LINES ...] [--rc-latency=MS]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # the kitten's modules
+
+import search_rc
+from search import Search, parse_ms
+from search_rc import RemoteControl
+from search_timing import Timings
+from search_topology import Topology
+
+LINE_COUNTS = (1_000, 10_000, 100_000)
+WINDOW_ID = 1
+OWN_ID = 2  # the search window
+STEPS = 50
+QUERIES = {"text": "connection refused", "regex": r"err(or)? \d+", "fuzzy": "cnrfsd"}
+WORDS = (
+    "GET POST connection refused timeout error warning info debug user session "
+    "request response handler worker queue retry failed ok started stopped /var/log"
+).split()
+
+
+def make_scrollback(lines: int, seed: int = 0) -> str:
+    """Log shaped lines, some of them matching QUERIES"""
+    rng = random.Random(seed)
+    return "\n".join(
+        f"{i:08d} [{rng.choice(('INFO', 'WARN', 'ERROR'))}] "
+        + " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        + (f" err {rng.randint(0, 999)}" if i % 17 == 0 else "")
+        for i in range(lines)
+    )
+
+
+def fake_remote_control(scrollback: str, latency: float):
+    """Answers get-text with the synthetic scrollback and ls with one window"""
+    ls = json.dumps(
+        [
+            {
+                "id": 1,
+                "tabs": [
+                    {
+                        "id": 1,
+                        "windows": [{"id": WINDOW_ID, "lines": 40}, {"id": OWN_ID, "lines": 1}],
+                    }
+                ],
+            }
+        ]
+    )
+
+    def call_remote_control(args: list[str]) -> subprocess.CompletedProcess:
+        if latency:
+            time.sleep(latency)
+        stdout = {"get-text": scrollback, "ls": ls}.get(args[0], "")
+        return subprocess.CompletedProcess(["kitty", "@", *args], 0, stdout.encode(), b"")
+
+    return call_remote_control
+
+
+def headless_search(timings: Timings) -> Search:
+    topology = Topology.from_ls(json.loads(search_rc.call_remote_control(["ls"]).stdout), kitty_pid="bench")
+    search = Search(
+        {},
+        [WINDOW_ID],
+        rc=RemoteControl(listen_on=""),  # every command goes through call_remote_control
+        mark_delay=0,
+        topology=topology,
+        timings=timings,
+    )
+    search.screen_size = SimpleNamespace(rows=1, cols=120)
+    search.write = lambda data: None
+    search.quit_loop = lambda return_code=None: None
+    search.initialize()
+    return search
+
+
+def bench_mode(mode: str) -> Timings:
+    """Launch, type QUERIES[mode] one key at a time, step through the matches"""
+    timings = Timings()
+    search = headless_search(timings)
+    search.mode = mode
+    search.update_prompt()
+    for char in QUERIES[mode]:
+        search.on_text(char)
+    for _ in range(STEPS):
+        search.step(1)
+    search.quit(1)
+    return timings
+
+
+def bench_search(line_counts: tuple[int, ...], latency: float) -> None:
+    print(f"{'lines':>8}{'mode':>7}{'launch':>9}{'get-text':>10}{'index':>9}{'key p50':>9}{'key p90':>9}{'key max':>9}{'step':>8}  (ms)")
+    for lines in line_counts:
+        search_rc.call_remote_control = fake_remote_control(make_scrollback(lines), latency)
+        for mode in QUERIES:
+            stats = bench_mode(mode).summary()
+            empty = {"median": 0.0, "p90": 0.0, "max": 0.0}
+            key = stats.get("keystroke", empty)
+            print(
+                f"{lines:>8}{mode:>7}{stats['launch']['median']:>9.2f}"
+                f"{stats.get('get-text', empty)['max']:>10.2f}{stats.get('index', empty)['max']:>9.2f}"
+                f"{key['median']:>9.2f}{key['p90']:>9.2f}{key['max']:>9.2f}"
+                f"{stats.get('step', empty)['median']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    counts = tuple(int(arg) for arg in sys.argv[1:] if arg.isdigit()) or LINE_COUNTS
+    bench_search(counts, parse_ms(sys.argv[1:], "--rc-latency", 0))
@@ -0,0 +1,224 @@
+# Fuzzy line scoring for the search kitten
+# Uses NumPy (python-numpy) when installed, plain re / str.find otherwise
+
+import heapq
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8  # match right after a separator or at the line start
+BONUS_CONSECUTIVE = 6
+PENALTY_GAP_START = 3  # first skipped character
+PENALTY_GAP = 1  # every further one
+BOUNDARY_CHARS = "\n \t/\\-_.:,;()[]{}<>'\"=|@"
+
+LINE_OFFSET = 1 << 32  # > any score difference within a line, keeps lines apart
+NO_MATCH = -(1 << 62)
+
+
+def subsequence_source(text: str) -> str:
+    """Regex source matching the characters of 'text' in order within one line"""
+    return "[^\\n]*?".join(re.escape(char) for char in text)
+
+
+def candidate_lines(text: str, pattern: re.Pattern[str]) -> list[tuple[int, int]]:
+    """(start, end) of every line 'pattern' matches in"""
+    lines = []
+    line_end = -1
+    for m in pattern.finditer(text):
+        if m.start() <= line_end:  # another hit on the same line
+            continue
+        line_start = text.rfind("\n", 0, m.start()) + 1
+        line_end = text.find("\n", m.end())
+        if line_end < 0:
+            line_end = len(text)
+        lines.append((line_start, line_end))
+    return lines
+
+
+def align(line: str, needle: str) -> tuple[float, int, int] | None:
+    """
+    (score, start, end) of a short subsequence match of needle in line
+    Leftmost end first, then the start is pulled as far right as possible.
+    Cheap enough for every candidate line, but not always the best alignment
+    """
+    end = 0
+    for char in needle:
+        end = line.find(char, end)
+        if end < 0:
+            return None
+        end += 1
+    start = end
+    for char in reversed(needle):
+        start = line.rfind(char, 0, start)
+
+    score = 0.0
+    previous = None
+    position = start
+    for char in needle:
+        position = line.find(char, position)
+        score += SCORE_MATCH
+        if position == 0 or line[position - 1] in BOUNDARY_CHARS:
+            score += BONUS_BOUNDARY
+        if previous is not None:
+            gap = position - previous - 1
+            if gap:
+                score -= PENALTY_GAP_START + PENALTY_GAP * (gap - 1)
+            else:
+                score += BONUS_CONSECUTIVE
+        previous = position
+        position += 1
+    return score, start, end
+
+
+def best_alignment(line: str, needle: str) -> tuple[float, int, int] | None:
+    """
+    (score, start, end) of the best scoring subsequence match of needle in line,
+    the same DP as FuzzyText in plain python, used for the few lines shown
+    """
+    previous: list[tuple[float, int] | None] = []
+    for j, char in enumerate(needle):
+        current: list[tuple[float, int] | None] = [None] * len(line)
+        gapped = None  # best (score, start) of chains at least one char back
+        for p in range(len(line)):
+            if j and p >= 2:
+                if gapped is not None:
+                    gapped = (gapped[0] - PENALTY_GAP, gapped[1])
+                chain = previous[p - 2]
+                if chain is not None and (gapped is None or chain[0] - PENALTY_GAP_START > gapped[0]):
+                    gapped = (chain[0] - PENALTY_GAP_START, chain[1])
+            if line[p] != char:
+                continue
+            gain = SCORE_MATCH + (BONUS_BOUNDARY if p == 0 or line[p - 1] in BOUNDARY_CHARS else 0)
+            if not j:
+                current[p] = (gain, p)
+                continue
+            options = [gapped] if gapped is not None else []
+            if p and previous[p - 1] is not None:
+                options.append((previous[p - 1][0] + BONUS_CONSECUTIVE, previous[p - 1][1]))
+            if options:
+                score, start = max(options)  # ties -> later start, shorter span
+                current[p] = (score + gain, start)
+        previous = current
+
+    ends = [(chain[0], chain[1], p + 1) for p, chain in enumerate(previous) if chain is not None]
+    return max(ends, key=lambda end: (end[0], end[1] - end[2]), default=None)
+
+
+class FuzzyText:
+    """
+    Code point arrays of one scrollback, built once per window and case,
+    every keystroke afterwards only touches positions of the needle's chars
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        newline = self.codes == 10
+        self.line_ids = np.cumsum(newline)
+        self.line_starts = np.concatenate(([0], np.flatnonzero(newline) + 1))
+        previous = np.concatenate(([10], self.codes[:-1]))
+        self.boundary = np.isin(previous, [ord(char) for char in BOUNDARY_CHARS])
+        self._positions: dict[str, "np.ndarray"] = {}
+        self._states: dict[str, tuple["np.ndarray", "np.ndarray"]] = {}
+
+    def positions(self, char: str) -> "np.ndarray":
+        if char not in self._positions:
+            self._positions[char] = np.flatnonzero(self.codes == ord(char))
+        return self._positions[char]
+
+    def line(self, line_id: int) -> tuple[int, int]:
+        start = int(self.line_starts[line_id])
+        end = int(self.line_starts[line_id + 1]) - 1 if line_id + 1 < len(self.line_starts) else len(self.text)
+        return start, end
+
+    def best_lines(self, needle: str, limit: int) -> list[tuple[float, int]]:
+        """(score, line id) of the 'limit' best lines, best first"""
+        # DP state of the longest already scored prefix -> one step per typed char
+        prefix = max((key for key in self._states if needle.startswith(key)), key=len, default="")
+        if prefix:
+            positions, score = self._states[prefix]
+        else:
+            prefix = needle[0]
+            positions = self.positions(prefix)
+            score = SCORE_MATCH + BONUS_BOUNDARY * self.boundary[positions].astype(np.int64)
+        for char in needle[len(prefix):]:
+            positions, score = self.step(positions, score, char)
+        self._states = {key: state for key, state in self._states.items() if needle.startswith(key)}
+        self._states[needle] = (positions, score)
+
+        if not len(positions):
+            return []
+        lines = self.line_ids[positions]
+        groups = np.concatenate(([0], np.flatnonzero(np.diff(lines)) + 1))
+        line_scores = np.maximum.reduceat(score, groups)
+        line_ids = lines[groups]
+        top = np.lexsort((line_ids, line_scores))[-limit:]  # ties -> more recent lines
+        return [(float(line_scores[i]), int(line_ids[i])) for i in top[::-1]]
+
+    def step(self, positions: "np.ndarray", score: "np.ndarray", char: str) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Smith-Waterman style DP step: best score of every chain that ends
+        at an occurrence of 'char', extending the chains ending at 'positions'
+        """
+        current = self.positions(char)
+        if not len(positions) or not len(current):
+            return current[:0], score[:0]
+        # best chain ending before each occurrence on the same line, minus the gap:
+        # prefix max of score + gap * q, lines shifted apart so others never win
+        shift = self.line_ids[positions] * LINE_OFFSET
+        best = np.maximum.accumulate(score + PENALTY_GAP * positions + shift)
+        before = np.searchsorted(positions, current) - 1
+        valid = before >= 0
+        chained = np.full(len(current), NO_MATCH, dtype=np.int64)
+        chained[valid] = (
+            best[before[valid]]
+            - PENALTY_GAP * (current[valid] - 1)
+            - self.line_ids[current[valid]] * LINE_OFFSET
+            - (PENALTY_GAP_START - PENALTY_GAP)
+        )
+        consecutive = valid & (positions[np.maximum(before, 0)] == current - 1)
+        chained[consecutive] = np.maximum(
+            chained[consecutive], score[before[consecutive]] + BONUS_CONSECUTIVE
+        )
+        keep = chained > -LINE_OFFSET // 2
+        gain = SCORE_MATCH + BONUS_BOUNDARY * self.boundary[current[keep]].astype(np.int64)
+        return current[keep], chained[keep] + gain
+
+
+def prepare(text: str) -> FuzzyText | None:
+    """NumPy view of text, None without NumPy"""
+    return FuzzyText(text) if np is not None else None
+
+
+def fuzzy_top(
+    text: str, needle: str, pattern: re.Pattern[str], limit: int, prepared: FuzzyText | None = None
+) -> list[tuple[float, int, int]]:
+    """
+    (score, start, end) of the 'limit' best lines of text, best first,
+    more recent lines win ties. 'text' is already lower-cased for smart case,
+    'pattern' is the compiled subsequence_source, 'prepared' the NumPy path
+    """
+    if prepared is not None:
+        top = []
+        for score, line_id in prepared.best_lines(needle, limit):
+            line_start, line_end = prepared.line(line_id)
+            aligned = best_alignment(text[line_start:line_end], needle)
+            if aligned is not None:
+                top.append((score, line_start + aligned[1], line_start + aligned[2]))
+        return top
+
+    scored = []
+    for line_start, line_end in candidate_lines(text, pattern):
+        aligned = align(text[line_start:line_end], needle)
+        if aligned is not None:
+            scored.append((aligned[0], line_start, line_end))
+    top = []
+    for _, line_start, line_end in heapq.nlargest(limit, scored, key=lambda hit: (hit[0], hit[1])):
+        score, start, end = best_alignment(text[line_start:line_end], needle)
+        top.append((score, line_start + start, line_start + end))
+    return top
@@ -0,0 +1,104 @@
+# Search history with a prefix trie for the search kitten
+
+from typing import Any
+
+HISTORY_SIZE = 5000
+HISTORY_HALF_LIFE = 200  # searches after which an entry's use count weighs half
+
+
+class TrieNode:
+    __slots__ = ("children", "recent", "frequent")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "TrieNode"] = {}
+        self.recent: list[str] = []  # queries below this node, most recent first
+        self.frequent: list[str] = []  # ... highest weight first
+
+
+class History:
+    """
+    Bounded history of searched queries, query -> [use count, last use tick]
+    Every trie node keeps the ranked queries below it, so a lookup only walks
+    the prefix. Over HISTORY_SIZE the entries with the lowest decayed use
+    count are evicted
+    """
+
+    def __init__(self, entries: dict[str, list[int]] | None = None, tick: int = 0, size: int = HISTORY_SIZE) -> None:
+        self.entries = entries or {}
+        self.tick = tick
+        self.size = size
+        self._root: TrieNode | None = None
+
+    @classmethod
+    def from_cached(cls, data: Any) -> "History":
+        try:
+            return cls({query: [int(count), int(last)] for query, (count, last) in data["entries"].items()}, int(data["tick"]))
+        except (KeyError, TypeError, ValueError):
+            return cls()
+
+    def to_cached(self) -> dict[str, Any]:
+        return {"entries": self.entries, "tick": self.tick}
+
+    def weight(self, query: str) -> float:
+        count, last = self.entries[query]
+        return count * 0.5 ** ((self.tick - last) / HISTORY_HALF_LIFE)
+
+    def record(self, query: str) -> None:
+        if not query:
+            return
+        self.tick += 1
+        count, _ = self.entries.get(query, (0, 0))
+        self.entries[query] = [count + 1, self.tick]
+        if len(self.entries) > self.size:
+            # evict a tenth at once, so the sort is not paid on every search
+            keep = sorted(self.entries, key=self.weight, reverse=True)[: self.size * 9 // 10]
+            self.entries = {query: self.entries[query] for query in keep}
+        self._root = None
+
+    def lookup(self, prefix: str, by_frequency: bool = False) -> list[str]:
+        """Queries starting with prefix, most recent (or most used) first"""
+        node = self.trie()
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.frequent if by_frequency else node.recent
+
+    def trie(self) -> TrieNode:
+        """Built on first lookup, searches that never browse the history skip it"""
+        if self._root is None:
+            self._root = TrieNode()
+            for order, ranking in (
+                ("recent", sorted(self.entries, key=lambda query: self.entries[query][1], reverse=True)),
+                ("frequent", sorted(self.entries, key=self.weight, reverse=True)),
+            ):
+                for query in ranking:
+                    node = self._root
+                    getattr(node, order).append(query)
+                    for char in query:
+                        node = node.children.setdefault(char, TrieNode())
+                        getattr(node, order).append(query)
+        return self._root
+
+
+class HistoryCursor:
+    """State of one ctrl+p / ctrl+n / ctrl+r walk through the history"""
+
+    def __init__(self, prefix: str, matches: list[str], by_frequency: bool) -> None:
+        self.prefix = prefix
+        self.matches = [query for query in matches if query != prefix]
+        self.by_frequency = by_frequency
+        self.position = -1  # -1 = the typed prefix
+        self.shown = prefix
+
+    def move(self, delta: int) -> str:
+        """+1 = older / less used, returns the query to show"""
+        self.position = max(-1, min(self.position + delta, len(self.matches) - 1))
+        self.shown = self.matches[self.position] if self.position >= 0 else self.prefix
+        return self.shown
+
+    def status(self) -> str:
+        if self.position < 0:
+            return ""
+        kind = "most used" if self.by_frequency else "history"
+        return f"{kind} {self.position + 1}/{len(self.matches)}"
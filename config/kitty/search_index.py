@@ -0,0 +1,430 @@
+# Scrollback match index for the search kitten
+
+import heapq
+import multiprocessing
+import os
+import re
+import signal
+from bisect import bisect_right
+from contextlib import contextmanager
+from functools import lru_cache
+from multiprocessing.connection import Connection
+from typing import Iterator, NamedTuple
+
+from search_fuzzy import FuzzyText, fuzzy_top, prepare, subsequence_source
+
+REGEX_META = set(".^$*+?{}[]\\|()")
+QUANTIFIERS = "*+?{"
+
+# below this much text a single process is faster than talking to workers
+PARALLEL_MIN_CHARS = 1_000_000
+
+COMPILE_CACHE_SIZE = 256
+# lines ranked and highlighted in fuzzy mode
+FUZZY_TOP = 20
+# a regex scan may take the budget once per this much scrollback text
+BUDGET_SAMPLE_CHARS = 200_000
+
+# ranking tiers of searched windows, lower is shown first
+TIER_ORIGIN, TIER_TAB, TIER_OS_WINDOW, TIER_OTHER = range(4)
+# --scope value -> widest tier searched
+SCOPE_TIERS = {"tab": TIER_TAB, "os-window": TIER_OS_WINDOW, "all": TIER_OTHER}
+
+
+class Match(NamedTuple):
+    window_id: int
+    line: int  # screen line counted from the top of the scrollback
+    start: int  # offsets into Scrollback.text
+    end: int
+
+
+class Scrollback:
+    """
+    Text of one window as returned by `get-text --extent all --add-wrap-markers`
+    Wrapped screen lines (ending with \\r) are joined so matches can span the
+    wrap, line_offsets keeps where each screen line starts
+    """
+
+    def __init__(self, window_id: int, raw: str, rows: int = 0, tier: int = TIER_ORIGIN) -> None:
+        self.window_id = window_id
+        self.rows = rows
+        self.tier = tier
+        self.line_offsets: list[int] = []
+        parts = []
+        offset = 0
+        for line in raw.split("\n"):
+            for segment in line.split("\r"):
+                self.line_offsets.append(offset)
+                parts.append(segment)
+                offset += len(segment)
+            parts.append("\n")
+            offset += 1
+        self.text = "".join(parts)
+        self._folded: str | None = None
+
+    @property
+    def folded(self) -> str | None:
+        """Lower-cased text, None if lowering would shift offsets"""
+        if self._folded is None:
+            lowered = self.text.lower()
+            self._folded = lowered if len(lowered) == len(self.text) else ""
+        return self._folded or None
+
+    def line_of(self, offset: int) -> int:
+        return bisect_right(self.line_offsets, offset) - 1
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_pattern(source: str, flags: int) -> re.Pattern[str]:
+    """re.compile behind an LRU, backspacing and retyping never recompiles"""
+    return re.compile(source, flags)
+
+
+class PatternTimeout(Exception):
+    pass
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Raises PatternTimeout inside the block once 'seconds' passed
+    re checks for signals while matching, so SIGALRM stops catastrophic backtracking
+    """
+    running = True
+
+    def expire(signum, frame):
+        if running:
+            raise PatternTimeout
+
+    try:
+        previous = signal.signal(signal.SIGALRM, expire)
+        armed = True
+    except ValueError:  # not the main thread -> no safety net
+        previous, armed = None, False
+    try:
+        if armed:
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+        yield
+    finally:
+        running = False
+        if armed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class Query:
+    """Search input compiled the same way kitty compiles markers (smart case)"""
+
+    def __init__(self, mode: str, text: str) -> None:
+        self.mode = mode
+        self.text = text
+        self.ignore_case = text.islower()
+        # text mode or a regex without special characters -> plain substring search
+        self.literal = mode == "text" or (mode == "regex" and not REGEX_META & set(text))
+        self.needle = text.lower() if self.ignore_case else text
+        flags = re.MULTILINE | (re.IGNORECASE if self.ignore_case else 0)
+        if mode == "fuzzy":
+            source = subsequence_source(text)
+        else:
+            source = re.escape(text) if self.literal else text
+        self.pattern = compile_pattern(source, flags)
+        # zero width lookahead -> finditer yields every start, overlapping ones too
+        self.starts = compile_pattern(f"(?=(?:{source}))", flags)
+
+    def refines(self, previous: "Query") -> bool:
+        """True if every match of this query starts where 'previous' matched"""
+        if self.mode != previous.mode or not previous.literal:
+            return False
+        if not self.text.startswith(previous.text):
+            return False
+        rest = self.text[len(previous.text):]
+        if self.mode == "regex" and rest and (rest[0] in QUANTIFIERS or "|" in rest):
+            return False  # "ab" -> "ab?" or "ab|c" matches more, not less
+        return True
+
+    @property
+    def self_overlapping(self) -> bool:
+        """True if two matches of a literal query can overlap, ex. aa in aaa"""
+        return any(self.needle[:k] == self.needle[-k:] for k in range(1, len(self.needle)))
+
+    def end(self, text: str, start: int) -> int:
+        if self.literal:
+            return start + len(self.text)
+        return self.pattern.match(text, start).end()
+
+
+class MatchIndex:
+    """
+    Match positions of the current query in every searched window
+    Candidates are all (overlapping) starts of a literal query, kept so the
+    next, longer query only rechecks them. Selected are the non-overlapping
+    matches kitty highlights. Windows are ranked by tier, then match count.
+    Fuzzy queries keep only the FUZZY_TOP best lines, ranked by score
+    """
+
+    def __init__(self, scrollbacks: list[Scrollback]) -> None:
+        self.scrollbacks = {sb.window_id: sb for sb in scrollbacks}
+        self.chars = sum(len(sb.text) for sb in scrollbacks)
+        self.query: Query | None = None
+        self.candidates: dict[int, list[int] | None] = {}
+        self.selected: dict[int, list[int]] = {}
+        self.counts: dict[int, int] = {}
+        self.order: list[int] = []
+        self.total = 0
+        self.current: int | None = None
+        # fuzzy mode: (score, -tier, match) best first, None otherwise
+        self.hits: list[tuple[float, int, Match]] | None = None
+        self.fuzzy_texts: dict[tuple[int, bool], FuzzyText | None] = {}
+
+    def scan_limit(self, budget: float) -> float:
+        """Seconds a regex scan of every window may take, 'budget' per BUDGET_SAMPLE_CHARS"""
+        return budget * max(1.0, self.chars / BUDGET_SAMPLE_CHARS)
+
+    def update(self, query: Query | None, budget: float | None = None) -> None:
+        """
+        Matches of 'query' in every window. With a budget a regex scan raises
+        PatternTimeout past scan_limit(budget) and leaves the index without a query
+        """
+        if query is not None and query.mode == "fuzzy":
+            self.candidates, self.selected = {}, {}
+            self.query = query
+            self.set_hits([hit for sb in self.scrollbacks.values() for hit in self.fuzzy_hits(query, sb)])
+            return
+        self.hits = None
+        if budget is None or query is None or query.literal:
+            self.scan(query)
+            return
+        try:
+            with deadline(self.scan_limit(budget)):
+                self.scan(query)
+        except PatternTimeout:
+            self.scan(None)
+            raise
+
+    def scan(self, query: Query | None) -> None:
+        refine = (
+            query is not None and self.query is not None and query.refines(self.query)
+        )
+        self.candidates = {} if query is None else {
+            window_id: self.find(query, sb, self.candidates[window_id] if refine else None)
+            for window_id, sb in self.scrollbacks.items()
+        }
+        self.selected = {
+            window_id: self.select(query, self.scrollbacks[window_id], candidates)
+            for window_id, candidates in self.candidates.items()
+        }
+        self.query = query
+        self.set_counts({window_id: len(starts) for window_id, starts in self.selected.items()})
+
+    def set_counts(self, counts: dict[int, int]) -> None:
+        self.counts = counts
+        # sorted() is stable -> window order breaks ties
+        self.order = sorted(counts, key=lambda window_id: (self.scrollbacks[window_id].tier, -counts[window_id]))
+        self.total = sum(counts.values())
+        self.current = None
+
+    def set_hits(self, hits: list[tuple[float, int, Match]]) -> None:
+        self.hits = heapq.nlargest(FUZZY_TOP, hits, key=lambda hit: hit[:2])
+        counts: dict[int, int] = {}
+        for _, _, match in self.hits:
+            counts[match.window_id] = counts.get(match.window_id, 0) + 1
+        self.set_counts(counts)
+
+    def fuzzy_hits(self, query: Query, sb: Scrollback) -> list[tuple[float, int, Match]]:
+        text = sb.folded if query.ignore_case else sb.text
+        if text is None:  # lowering would shift offsets -> case sensitive
+            text = sb.text
+        key = (sb.window_id, text is not sb.text)
+        if key not in self.fuzzy_texts:
+            self.fuzzy_texts[key] = prepare(text)
+        return [
+            (score, -sb.tier, Match(sb.window_id, sb.line_of(start), start, end))
+            for score, start, end in fuzzy_top(
+                text, query.needle, query.pattern, FUZZY_TOP, self.fuzzy_texts[key]
+            )
+        ]
+
+    def fuzzy_pattern(self) -> str:
+        """Regex kitty can mark the best fuzzy lines with, longest spans first"""
+        spans = {
+            self.scrollbacks[match.window_id].text[match.start:match.end]
+            for _, _, match in self.hits or []
+        }
+        return "|".join(re.escape(span) for span in sorted(spans, key=len, reverse=True))
+
+    @staticmethod
+    def find(query: Query, sb: Scrollback, candidates: list[int] | None) -> list[int] | None:
+        """
+        Every start of query, only rechecks 'candidates' when given
+        None for a fresh regex query, those are never refined
+        """
+        if candidates is not None:
+            if query.literal:
+                haystack = sb.folded if query.ignore_case else sb.text
+                if haystack is not None:
+                    return [start for start in candidates if haystack.startswith(query.needle, start)]
+            match = query.pattern.match
+            return [start for start in candidates if match(sb.text, start)]
+        if query.literal:
+            return [m.start() for m in query.starts.finditer(sb.text)]
+        return None
+
+    @staticmethod
+    def select(query: Query, sb: Scrollback, candidates: list[int] | None) -> list[int]:
+        """Starts of the matches kitty highlights (left to right, non-overlapping)"""
+        if candidates is None:
+            return [
+                m.start()
+                for m in query.pattern.finditer(sb.text)
+                # kitty marks line by line and skips empty matches
+                if m.end() > m.start() and "\n" not in m.group()
+            ]
+        if query.literal and not query.self_overlapping:
+            return candidates
+        selected = []
+        end = 0
+        for start in candidates:
+            if start < end:
+                continue
+            stop = query.end(sb.text, start)
+            if stop == start or "\n" in sb.text[start:stop]:
+                continue
+            selected.append(start)
+            end = stop
+        return selected
+
+    def match_in(self, window_id: int, k: int) -> Match:
+        """k-th match of one window"""
+        sb = self.scrollbacks[window_id]
+        start = self.selected[window_id][k]
+        return Match(window_id, sb.line_of(start), start, self.query.end(sb.text, start))
+
+    def match_at(self, k: int) -> Match:
+        """k-th match of the merged, ranked result list"""
+        if self.hits is not None:
+            return self.hits[k][2]
+        for window_id in self.order:
+            if k < self.counts[window_id]:
+                return self.match_in(window_id, k)
+            k -= self.counts[window_id]
+        raise IndexError(k)
+
+    def step(self, delta: int) -> Match | None:
+        """Moves the current match by 'delta' (wraps around), -1 = towards the top"""
+        if not self.total:
+            return None
+        if self.current is None:  # fuzzy hits start at the best line either way
+            self.current = self.total - 1 if delta < 0 and self.hits is None else 0
+        else:
+            self.current = (self.current + delta) % self.total
+        return self.match_at(self.current)
+
+    def status(self) -> str:
+        if self.query is None:
+            return ""
+        if self.current is None:
+            return f"best {self.total} lines" if self.hits is not None else f"{self.total} matches"
+        status = f"{self.current + 1} of {self.total}"
+        if len(self.scrollbacks) > 1:
+            status += f" [{self.match_at(self.current).window_id}]"
+        return status
+
+    def close(self) -> None:
+        pass
+
+
+class ParallelIndex(MatchIndex):
+    """
+    MatchIndex split over forked worker processes (re holds the GIL, threads
+    would not help). Workers inherit the scrollback text without copying and
+    keep the candidates of their windows, only counts travel per keystroke
+    """
+
+    def __init__(self, scrollbacks: list[Scrollback], workers: int) -> None:
+        super().__init__(scrollbacks)
+        ctx = multiprocessing.get_context("fork")
+        self.conns: dict[int, Connection] = {}
+        self.processes = []
+        for i in range(workers):
+            group = scrollbacks[i::workers]
+            conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=serve_index, args=(child_conn, MatchIndex(group)), daemon=True)
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.conns.update({sb.window_id: conn for sb in group})
+
+    def update(self, query: Query | None, budget: float | None = None) -> None:
+        """Every worker applies the budget to its own windows, one over it fails the whole query"""
+        conns = list(dict.fromkeys(self.conns.values()))
+        for conn in conns:
+            conn.send(("update", query.mode, query.text, budget) if query is not None else ("update", None, None, None))
+        counts = {}
+        hits = []
+        timed_out = False
+        for conn in conns:
+            reply = conn.recv()
+            if reply is None:
+                timed_out = True
+                continue
+            worker_counts, worker_hits = reply
+            counts.update(worker_counts)
+            hits.extend(worker_hits or [])
+        if timed_out:
+            self.update(None)
+            raise PatternTimeout
+        self.query = query
+        if query is not None and query.mode == "fuzzy":
+            self.set_hits(hits)
+        else:
+            self.hits = None
+            self.set_counts({window_id: counts[window_id] for window_id in self.scrollbacks if window_id in counts})
+
+    def match_in(self, window_id: int, k: int) -> Match:
+        conn = self.conns[window_id]
+        conn.send(("match", window_id, k))
+        return conn.recv()
+
+    def close(self) -> None:
+        # an explicit request, later workers hold copies of earlier pipes -> no EOF
+        for conn in dict.fromkeys(self.conns.values()):
+            conn.send(("close",))
+            conn.close()
+        for process in self.processes:
+            process.join(timeout=0.5)
+            if process.is_alive():
+                process.terminate()
+
+
+def serve_index(conn: Connection, index: MatchIndex) -> None:
+    """Worker loop of ParallelIndex"""
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request[0] == "close":
+            return
+        if request[0] == "update":
+            _, mode, text, budget = request
+            try:
+                index.update(Query(mode, text) if text is not None else None, budget)
+            except PatternTimeout:
+                conn.send(None)
+                continue
+            conn.send((index.counts, index.hits))
+        elif request[0] == "match":
+            conn.send(index.match_in(*request[1:]))
+
+
+def build_index(scrollbacks: list[Scrollback]) -> MatchIndex:
+    """Parallel index for several big scrollbacks, in-process one otherwise"""
+    workers = min(len(scrollbacks), os.cpu_count() or 1)
+    if workers > 1 and sum(len(sb.text) for sb in scrollbacks) >= PARALLEL_MIN_CHARS:
+        try:
+            return ParallelIndex(scrollbacks, workers)
+        except OSError:
+            pass
+    return MatchIndex(scrollbacks)
+
+
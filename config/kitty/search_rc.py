@@ -0,0 +1,150 @@
+# Persistent remote control client for the search kitten
+
+import json
+import os
+import socket
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+FRAME_START = b"\x1bP@kitty-cmd"
+FRAME_END = b"\x1b\\"
+MAX_PROCESSES = 8  # parallel `kitty @` fallbacks
+
+
+def call_remote_control(args: list[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(["kitty", "@", *args], capture_output=True)
+
+
+def match_windows(window_ids: list[int]) -> str:
+    """One --match expression covering all windows -> one command instead of N"""
+    return " or ".join(f"id:{window_id}" for window_id in window_ids)
+
+
+def socket_address(listen_on: str) -> Optional[str]:
+    """unix:/path or unix:@abstract (kitty's listen_on syntax) -> AF_UNIX address"""
+    if not listen_on.startswith("unix:"):
+        return None
+    path = listen_on[len("unix:"):]
+    return "\0" + path[1:] if path.startswith("@") else path
+
+
+class RemoteControl:
+    """
+    Keeps one connection to kitty's control socket ($KITTY_LISTEN_ON, needs
+    listen_on in kitty.conf). Commands sent inside batch() are written in one
+    go and only the responses that are asked for are read back, in order.
+    Without a usable socket every command falls back to a `kitty @` process.
+    """
+
+    def __init__(self, listen_on: Optional[str] = None) -> None:
+        if listen_on is None:
+            listen_on = os.environ.get("KITTY_LISTEN_ON", "")
+        self.address = socket_address(listen_on)
+        self._sock: Optional[socket.socket] = None
+        self._queue: Optional[list[tuple[list[str], bool]]] = None
+        self._global_opts = None
+
+    def connect(self) -> bool:
+        if self._sock is not None:
+            return True
+        if not self.address:
+            return False
+        try:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(5)
+            self._sock.connect(self.address)
+        except OSError:
+            self.close()
+            self.address = None  # don't retry on every keystroke
+            return False
+        return True
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def send(self, args: list[str], response: bool = False) -> Optional[str]:
+        """
+        Runs `kitty @ <args>`, returns the response data if asked for
+        Inside batch() the command is only queued and None is returned
+        """
+        if self._queue is not None:
+            self._queue.append((args, response))
+            return None
+        return self._send_many([(args, response)])[0]
+
+    def send_many(self, commands: list[list[str]]) -> list[Optional[str]]:
+        """
+        Runs independent commands in one round trip, returns all responses
+        Without the socket the `kitty @` processes run in parallel
+        """
+        return self._send_many([(args, True) for args in commands], ordered=False)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        outer = self._queue is not None
+        if not outer:
+            self._queue = []
+        try:
+            yield
+        finally:
+            if not outer:
+                queue, self._queue = self._queue, None
+                if queue:
+                    self._send_many(queue)
+
+    def _send_many(
+        self, commands: list[tuple[list[str], bool]], ordered: bool = True
+    ) -> list[Optional[str]]:
+        if self.connect():
+            try:
+                return self._send_socket(commands)
+            except (OSError, ValueError, SystemExit, ImportError):
+                self.close()
+        if not ordered and len(commands) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(commands), MAX_PROCESSES)) as pool:
+                return list(pool.map(lambda command: self._send_process(*command), commands))
+        return [self._send_process(args, response) for args, response in commands]
+
+    def _send_socket(self, commands: list[tuple[list[str], bool]]) -> list[Optional[str]]:
+        self._sock.sendall(b"".join(self._encode(args, response) for args, response in commands))
+
+        results: list[Optional[str]] = []
+        buffer = b""
+        for _, response in commands:
+            if not response:
+                results.append(None)
+                continue
+            while FRAME_END not in buffer:
+                chunk = self._sock.recv(65536)
+                if not chunk:
+                    raise OSError("kitty closed the control socket")
+                buffer += chunk
+            frame, buffer = buffer.split(FRAME_END, 1)
+            reply = json.loads(frame[frame.index(FRAME_START) + len(FRAME_START):])
+            results.append(reply.get("data") if reply.get("ok") else None)
+        return results
+
+    def _encode(self, args: list[str], response: bool) -> bytes:
+        # payloads are built by kitty's own rc command definitions,
+        # so they always match the running kitty version
+        from kitty.rc.base import command_for_name, parse_subcommand_cli
+        from kitty.remote_control import create_basic_command, encode_send, parse_rc_args
+
+        if self._global_opts is None:
+            self._global_opts, _ = parse_rc_args(["kitty"])
+        command = command_for_name(args[0])
+        opts, items = parse_subcommand_cli(command, args)
+        payload = command.message_to_kitty(self._global_opts, opts, items)
+        send = create_basic_command(args[0], payload, no_response=not response)
+        if "KITTY_WINDOW_ID" in os.environ:  # lets --self resolve like it does for `kitty @`
+            send["kitty_window_id"] = int(os.environ["KITTY_WINDOW_ID"])
+        return encode_send(send)
+
+    @staticmethod
+    def _send_process(args: list[str], response: bool) -> Optional[str]:
+        p = call_remote_control(args)
+        return p.stdout.decode() if response and p.returncode == 0 else None
@@ -0,0 +1,99 @@
+# Latency instrumentation for the search kitten
+
+import functools
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+TIMING_SAMPLES = 1024  # ring buffer size, the oldest samples are dropped
+TIMING_ENV = "KITTY_SEARCH_TIMINGS"  # file the timings are appended to on exit
+
+
+class Timings:
+    """
+    Last TIMING_SAMPLES (event, seconds) pairs of one search
+    Events: draw, mark, rc (create-marker round trip), get-text, index,
+    step, keystroke (first keystroke of a burst -> marker applied, debounce
+    included) and launch (main() -> first draw)
+    """
+
+    def __init__(self, size: int = TIMING_SAMPLES, started: float | None = None) -> None:
+        self.samples: deque[tuple[str, float]] = deque(maxlen=size)
+        self.started = time.perf_counter() if started is None else started
+        self.pending: float | None = None  # keystroke waiting for its marker
+
+    def record(self, event: str, seconds: float) -> None:
+        self.samples.append((event, seconds))
+
+    @contextmanager
+    def measure(self, event: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(event, time.perf_counter() - start)
+
+    def launched(self) -> None:
+        self.record("launch", time.perf_counter() - self.started)
+
+    def keystroke(self) -> None:
+        if self.pending is None:  # debounced keystrokes count from the first one
+            self.pending = time.perf_counter()
+
+    def applied(self) -> None:
+        if self.pending is not None:
+            self.record("keystroke", time.perf_counter() - self.pending)
+            self.pending = None
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """event -> count, median, p90 and max in ms"""
+        by_event: dict[str, list[float]] = {}
+        for event, seconds in self.samples:
+            by_event.setdefault(event, []).append(seconds * 1000)
+        summary = {}
+        for event, values in by_event.items():
+            values.sort()
+            summary[event] = {
+                "count": len(values),
+                "median": values[len(values) // 2],
+                "p90": values[min(len(values) * 9 // 10, len(values) - 1)],
+                "max": values[-1],
+            }
+        return summary
+
+    def format(self) -> str:
+        lines = [f"{'event':<12}{'count':>7}{'median':>10}{'p90':>10}{'max':>10}  (ms)"]
+        for event, stats in self.summary().items():
+            lines.append(
+                f"{event:<12}{stats['count']:>7}{stats['median']:>10.3f}{stats['p90']:>10.3f}{stats['max']:>10.3f}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: str | None = None) -> None:
+        """Appends the summary and raw samples as one JSON line to path ($KITTY_SEARCH_TIMINGS)"""
+        path = path or os.environ.get(TIMING_ENV)
+        if not path:
+            return
+        record = {"time": time.time(), "summary": self.summary(), "samples": list(self.samples)}
+        try:
+            with open(path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+
+
+def timed(event: str) -> Callable:
+    """Records every call of a method of an object with a 'timings' attribute"""
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            with self.timings.measure(event):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,138 @@
+# Cached kitty window topology for the search kitten
+
+import json
+import os
+import time
+from typing import Any, NamedTuple
+
+from search_index import SCOPE_TIERS, TIER_ORIGIN, TIER_OS_WINDOW, TIER_OTHER, TIER_TAB
+
+TOPOLOGY_TTL = 300  # bounds how long closed/moved/resized windows can go unnoticed
+
+
+class WindowInfo(NamedTuple):
+    os_window: int
+    tab: int
+    lines: int
+
+
+class Topology:
+    """
+    Flattened `kitty @ ls` of one kitty instance: window id -> WindowInfo
+    Kitty hands out window ids in increasing order, so a cached topology
+    still knows every window as long as the new search window is max id + 1
+    """
+
+    def __init__(
+        self,
+        windows: dict[int, WindowInfo],
+        kitty_pid: str | None = None,
+        created: float | None = None,
+    ) -> None:
+        self.windows = windows
+        self.kitty_pid = current_kitty_pid() if kitty_pid is None else kitty_pid
+        self.created = time.time() if created is None else created
+        self.max_id = max(windows, default=0)
+
+    @classmethod
+    def from_ls(cls, ls_json: list, kitty_pid: str | None = None) -> "Topology":
+        return cls(
+            {
+                window["id"]: WindowInfo(os_window["id"], tab["id"], window.get("lines", 0))
+                for os_window in ls_json
+                for tab in os_window["tabs"]
+                for window in tab["windows"]
+            },
+            kitty_pid,
+        )
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "Topology":
+        windows = {int(window_id): WindowInfo(*info) for window_id, info in data["windows"].items()}
+        return cls(windows, data["kitty_pid"], data["created"])
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "windows": {str(window_id): list(info) for window_id, info in self.windows.items()},
+            "kitty_pid": self.kitty_pid,
+            "created": self.created,
+        }
+
+    def valid_for(self, own_id: int | None, ttl: float = TOPOLOGY_TTL) -> bool:
+        """True if no window was opened since this topology was taken"""
+        return (
+            own_id is not None
+            and current_kitty_pid() == self.kitty_pid
+            and own_id == self.max_id + 1
+            and time.time() - self.created < ttl
+        )
+
+    def add(self, window_id: int, next_to: int) -> None:
+        """
+        Records a window opened in the tab of 'next_to' (the search window)
+        The newest known window is the previous search window, long closed
+        """
+        self.windows.pop(self.max_id, None)
+        if next_to in self.windows:
+            self.windows[window_id] = self.windows[next_to]._replace(lines=0)
+        self.max_id = max(self.max_id, window_id)
+
+    def rows(self, window_id: int) -> int:
+        info = self.windows.get(window_id)
+        return info.lines if info is not None else 0
+
+    def scope_windows(self, window_id: int, scope: str, own_id: int | None = None) -> dict[int, int] | None:
+        """
+        window id -> tier of every window searched for 'scope' around window_id,
+        None if window_id is unknown
+        """
+        origin = self.windows.get(window_id)
+        if origin is None:
+            return None
+
+        tiers = {}
+        for other_id, info in self.windows.items():
+            if other_id == own_id:  # the search window
+                continue
+            if other_id == window_id:
+                tier = TIER_ORIGIN
+            elif info.tab == origin.tab:
+                tier = TIER_TAB
+            elif info.os_window == origin.os_window:
+                tier = TIER_OS_WINDOW
+            else:
+                tier = TIER_OTHER
+            if tier <= SCOPE_TIERS[scope]:
+                tiers[other_id] = tier
+        return dict(sorted(tiers.items(), key=lambda item: item[1]))
+
+
+def current_kitty_pid() -> str:
+    """Identifies the kitty instance, window ids restart with every instance"""
+    return os.environ.get("KITTY_PID", "")
+
+
+def cached_topology(cached_values: dict[str, Any], window_id: int, own_id: int | None) -> Topology | None:
+    """
+    Topology stored by an earlier search, None if a window was opened since
+    The search window is added, so the next search can reuse it as well
+    """
+    try:
+        topology = Topology.from_json(cached_values["topology"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not topology.valid_for(own_id):
+        return None
+    topology.add(own_id, window_id)
+    cached_values["topology"] = topology.to_json()
+    return topology
+
+
+def store_topology(cached_values: dict[str, Any], ls_reply: str | None) -> Topology | None:
+    """Topology from a fresh `kitty @ ls`, None if kitty did not answer"""
+    try:
+        topology = Topology.from_ls(json.loads(ls_reply or ""))
+    except (ValueError, KeyError, TypeError):
+        return None
+    cached_values["topology"] = topology.to_json()
+    return topology
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 import subprocess
+import json
 import sys
 import time
 import re
 
 from typing import Dict, Any, List
 
+import btctl
+
 DIVIDER = "---------"
 BACK = "Back"
 ROFI_OPTS = ["rofi", "-dmenu", "-i", "-p", "Bluetooth"]
@@ -20,25 +23,25 @@ def run_cmd(cmd, timeout=None):
 # --- Controller‐level helpers ---
 
 def is_powered() -> bool:
-    out, _ = run_cmd(["bluetoothctl", "show"])
+    out = btctl.run("show")
     return "Powered: yes" in out
 
 
 def toggle_power():
     if is_powered():
-        run_cmd(["bluetoothctl", "power", "off"])
+        btctl.run("power", "off")
     else:
         # If soft‐blocked, unblock first
         out, _ = run_cmd(["rfkill", "list", "bluetooth"])
         if "blocked: yes" in out:
             run_cmd(["rfkill", "unblock", "bluetooth"])
             time.sleep(1)
-        run_cmd(["bluetoothctl", "power", "on"])
+        btctl.run("power", "on")
     show_menu()
 
 
 def is_scanning() -> bool:
-    out, _ = run_cmd(["bluetoothctl", "show"])
+    out = btctl.run("show")
     return "Discovering: yes" in out
 
 
@@ -46,36 +49,36 @@ def toggle_scan():
     if is_scanning():
         # Attempt to kill any lingering scan processes
         subprocess.run(["pkill", "-f", "bluetoothctl --timeout 5 scan on"])
-        run_cmd(["bluetoothctl", "scan", "off"])
+        btctl.run("scan", "off")
     else:
-        run_cmd(["bluetoothctl", "--timeout", "5", "scan", "on"])
+        btctl.run("--timeout", "5", "scan", "on")
     show_menu()
 
 
 def is_pairable():
-    out, _ = run_cmd(["bluetoothctl", "show"])
+    out = btctl.run("show")
     return "Pairable: yes" in out
 
 
 def toggle_pairable():
-    run_cmd(["bluetoothctl", "pairable", "off" if is_pairable() else "on"])
+    btctl.run("pairable", "off" if is_pairable() else "on")
     show_menu()
 
 
 def is_discoverable():
-    out, _ = run_cmd(["bluetoothctl", "show"])
+    out = btctl.run("show")
     return "Discoverable: yes" in out
 
 
 def toggle_discoverable():
-    run_cmd(["bluetoothctl", "discoverable", "off" if is_discoverable() else "on"])
+    btctl.run("discoverable", "off" if is_discoverable() else "on")
     show_menu()
 
 
 # --- Device‐level helpers ---
 
 def info(mac):
-    out, _ = run_cmd(["bluetoothctl", "info", mac])
+    out = btctl.run("info", mac)
     return out
 
 
@@ -92,17 +95,17 @@ def is_trusted(mac):
 
 
 def toggle_connection(mac, name):
-    run_cmd(["bluetoothctl", "disconnect" if is_connected(mac) else "connect", mac])
+    btctl.run("disconnect" if is_connected(mac) else "connect", mac)
     device_menu(mac, name)
 
 
 def toggle_paired(mac, name):
-    run_cmd(["bluetoothctl", "remove" if is_paired(mac) else "pair", mac])
+    btctl.run("remove" if is_paired(mac) else "pair", mac)
     device_menu(mac, name)
 
 
 def toggle_trust(mac, name):
-    run_cmd(["bluetoothctl", "untrust" if is_trusted(mac) else "trust", mac])
+    btctl.run("untrust" if is_trusted(mac) else "trust", mac)
     device_menu(mac, name)
 
 
@@ -119,31 +122,74 @@ def rofi(prompt, options):
     return p.stdout.strip()
 
 
-def print_status():
-    """Emulate --status mode for a status bar."""
-    if not is_powered():
-        print("")
-        return
+def get_connected_devices():
+    """
+    Returns [(alias, battery) ...] of connected devices, None if powered off
+    Reads the D-Bus model when available, otherwise the bluetoothctl session
+    """
+    watcher = btctl.get_watcher()
+    if watcher is not None:
+        snapshot = watcher.model.snapshot()
+        if not snapshot['status']['powered']:
+            return None
+        return [(i['alias'], i['battery']) for i in snapshot['info'].values() if i.get('connected')]
 
-    sys.stdout.write("")
+    if not is_powered():
+        return None
     # detect paired‐devices command name
-    out, _ = run_cmd(["bluetoothctl", "version"])
+    out = btctl.run("version")
     ver = float(out.split()[1])
     cmd = "paired-devices" if ver < 5.65 else "devices Paired"
-    out, _ = run_cmd(["bluetoothctl"] + cmd.split())
-    lines = [l for l in out.splitlines() if l.startswith("Device ")]
-    first = True
-    for l in lines:
-        mac = l.split()[1]
-        if is_connected(mac):
-            alias = [m for m in info(mac).splitlines()
-                     if m.startswith("Alias")][0].split(" ", 1)[1]
-            if not first:
-                sys.stdout.write(", " + alias)
-            else:
-                sys.stdout.write(" " + alias)
-                first = False
-    print()
+    devices = []
+    for mac, _ in btctl.parse_devices(btctl.run(*cmd.split())):
+        device_info = btctl.parse_info(info(mac))
+        if device_info['connected']:
+            devices.append((device_info['alias'], device_info['battery']))
+    return devices
+
+
+def format_status(devices, json_output=False) -> str:
+    if devices is None:
+        text, tooltip, css_class = "", "Bluetooth Disabled", "off"
+    else:
+        names = [alias if battery is None else f"{alias} ({battery}%)" for alias, battery in devices]
+        text = "" + (" " + ", ".join(names) if names else "")
+        tooltip = "\n".join(names) or "No device connected"
+        css_class = "connected" if names else "on"
+
+    if json_output:
+        return json.dumps({"text": text, "tooltip": tooltip, "class": css_class})
+    return text
+
+
+def print_status(json_output=False):
+    """Emulate --status mode for a status bar."""
+    print(format_status(get_connected_devices(), json_output))
+
+
+def follow_status(json_output=False, min_interval=1, max_interval=30):
+    """
+    --status --follow: stays resident and prints a line only when the connected
+    devices or their battery levels change, polling backs off while nothing does
+    """
+    watcher = btctl.get_watcher()
+    last = None
+    interval = min_interval
+    while True:
+        devices = get_connected_devices()
+        if devices != last:
+            print(format_status(devices, json_output), flush=True)
+            last = devices
+            interval = min_interval
+        else:
+            interval = min(interval * 2, max_interval)
+
+        if watcher is not None:
+            # signals wake us up, the timeout is only a safety net
+            version = watcher.model.version
+            watcher.model.wait_for(lambda model: model.version != version, max_interval)
+        else:
+            time.sleep(interval)
 
 
 class Device:
@@ -161,7 +207,7 @@ class Device:
         """
         Returns dictionary containing device information
         """
-        info_string, _ = run_cmd(["bluetoothctl", "info", mac])
+        info_string = btctl.run("info", mac)
         print(info_string)
         result = {}
         result['name'] = re.search(r'Name: (.*)$', info_string, re.MULTILINE).group(1)
@@ -179,9 +225,9 @@ class Device:
 
     def toggle_connection(self) -> None:
         if not self.info['connected']:
-            run_cmd(["bluetoothctl", "connect", self.mac])
+            btctl.run("connect", self.mac)
         else:
-            run_cmd(["bluetoothctl", "disconnect", self.mac])
+            btctl.run("disconnect", self.mac)
 
 
 def device_menu(dev: Device):
@@ -203,8 +249,8 @@ def device_menu(dev: Device):
 
 
 def list_devices() -> List[Device]:
-    out_paired, _ = run_cmd(["bluetoothctl", "devices", "Paired"])
-    out_connected, _ = run_cmd(["bluetoothctl", "devices", "Connected"])
+    out_paired = btctl.run("devices", "Paired")
+    out_connected = btctl.run("devices", "Connected")
     devices = [Device(l) for l in out_paired.splitlines() if l.startswith("Device")]
 
     return devices
@@ -216,7 +262,7 @@ def show_menu():
     """
     if is_powered():
         # list devices
-        out, _ = run_cmd(["bluetoothctl", "devices"])
+        out = btctl.run("devices")
         # parse "Device XX:XX:XX:XX:XX Name" lines
         devs = list_devices()
         dev_strings = [d.get_status_string() for d in devs]
@@ -251,6 +297,9 @@ def show_menu():
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--status":
-        print_status()
+        if "--follow" in sys.argv:
+            follow_status(json_output="--json" in sys.argv)
+        else:
+            print_status(json_output="--json" in sys.argv)
     else:
         show_menu()
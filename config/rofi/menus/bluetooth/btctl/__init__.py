@@ -0,0 +1,5 @@
+from .parse import parse_show, parse_info, parse_devices
+from .query import fetch_snapshot, fetch_device_info
+from .session import Bluetoothctl, get_controller, run, run_background
+from .cache import StatusCache, get_cache
+from .watcher import BluezWatcher, DeviceModel, get_watcher
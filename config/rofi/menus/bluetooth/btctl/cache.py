@@ -0,0 +1,101 @@
+"""
+TTL cache for bluetoothctl query replies
+Shared between menu invocations through a small JSON file in the per-user
+$XDG_RUNTIME_DIR (~/.cache without it), never the shared /tmp: its replies
+end up in the menu and their MACs in 'connect'. Entries are keyed by adapter + command (+ mac for 'info')
+"""
+import json
+import os
+import time
+from typing import Dict, Any, Optional, Sequence
+
+CACHE_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+CACHE_PATH = os.path.join(CACHE_DIR, "rofi_menu_bluetooth.json")
+
+# seconds, commands missing here are treated as mutations
+TTL = {
+    "show": 2,
+    "info": 5,
+    "devices": 10,
+    "version": 3600,
+}
+
+
+class StatusCache:
+    """bluetoothctl replies with per-command TTL"""
+
+    def __init__(self, path: str = CACHE_PATH, adapter: str = "default"):
+        self.path = path
+        self.adapter = adapter
+        self.data: Dict[str, Any] = {}
+        self._mtime = None
+
+    @staticmethod
+    def is_query(args: Sequence[str]) -> bool:
+        return bool(args) and args[0] in TTL
+
+    def key(self, args: Sequence[str]) -> str:
+        return "/".join([self.adapter, *args])
+
+    def get(self, args: Sequence[str]) -> Optional[str]:
+        """Returns cached reply or None if missing/expired"""
+        if not self.is_query(args):
+            return None
+        self.load()
+        entry = self.data.get(self.key(args))
+        if entry is None or time.time() - entry["time"] > TTL[args[0]]:
+            return None
+        return entry["reply"]
+
+    def set(self, args: Sequence[str], reply: str) -> None:
+        if not self.is_query(args) or not reply:
+            return
+        self.load()
+        self.data[self.key(args)] = {"time": time.time(), "reply": reply}
+        self.save()
+
+    def invalidate(self) -> None:
+        """Drops every entry of this adapter (called after each mutation)"""
+        self.load()
+        prefix = f"{self.adapter}/"
+        self.data = {key: val for key, val in self.data.items() if not key.startswith(prefix)}
+        self.save()
+
+    def load(self) -> None:
+        """(Re)loads the file if another process changed it"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self.data, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        self._mtime = mtime
+
+    def save(self) -> None:
+        """Best effort, an unwritable cache only costs the next query a bluetoothctl call"""
+        tmp_path = f"{self.path}.{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+_cache: Optional[StatusCache] = None
+
+
+def get_cache() -> StatusCache:
+    global _cache
+    if _cache is None:
+        _cache = StatusCache()
+    return _cache
@@ -0,0 +1,151 @@
+"""
+Fake BlueZ on a private session bus
+Starts 'dbus-daemon --session', exports an org.bluez with one adapter and
+one device, and checks that BluezWatcher subscribes (AddMatch), loads the
+tree (GetManagedObjects) and follows PropertiesChanged / InterfacesAdded /
+InterfacesRemoved. Needs dbus-daemon and dbus-next, run from menus/bluetooth:
+python -m btctl.fake_bluez
+"""
+import asyncio
+import subprocess
+import tempfile
+from typing import Dict, Optional
+
+from dbus_next import Message, MessageType, Variant
+from dbus_next.aio import MessageBus
+
+from .watcher import (
+    ADAPTER_IFACE, BATTERY_IFACE, BLUEZ_SERVICE, DEVICE_IFACE, OBJECT_MANAGER_IFACE, PROPERTIES_IFACE,
+    BluezWatcher,
+)
+
+ADAPTER_PATH = "/org/bluez/hci0"
+TIMEOUT = 2
+
+Objects = Dict[str, Dict[str, Dict[str, Variant]]]
+
+
+def device(mac: str, name: str, connected: bool) -> Dict[str, Dict[str, Variant]]:
+    return {
+        DEVICE_IFACE: {
+            "Address": Variant("s", mac),
+            "Name": Variant("s", name),
+            "Alias": Variant("s", name),
+            "Paired": Variant("b", True),
+            "Trusted": Variant("b", True),
+            "Connected": Variant("b", connected),
+        },
+        BATTERY_IFACE: {"Percentage": Variant("y", 73)},
+    }
+
+
+def device_path(mac: str) -> str:
+    return f"{ADAPTER_PATH}/dev_{mac.replace(':', '_')}"
+
+
+class FakeBluez:
+    """org.bluez on 'bus_address', signals are sent as BlueZ would"""
+
+    def __init__(self, bus_address: str):
+        self.bus_address = bus_address
+        self.bus = None
+        self.objects: Objects = {
+            ADAPTER_PATH: {ADAPTER_IFACE: {
+                "Powered": Variant("b", True),
+                "Discoverable": Variant("b", False),
+                "Pairable": Variant("b", True),
+                "Discovering": Variant("b", False),
+            }},
+        }
+
+    async def start(self) -> None:
+        self.bus = await MessageBus(bus_address=self.bus_address).connect()
+        self.bus.add_message_handler(self._on_call)  # exported interfaces get dbus-next's own ObjectManager
+        await self.bus.request_name(BLUEZ_SERVICE)
+
+    def _on_call(self, msg: Message) -> Optional[Message]:
+        if (msg.message_type == MessageType.METHOD_CALL and msg.path == "/"
+                and msg.interface == OBJECT_MANAGER_IFACE and msg.member == "GetManagedObjects"):
+            return Message.new_method_return(msg, "a{oa{sa{sv}}}", [self.objects])
+        return None
+
+    def add(self, path: str, interfaces: Dict[str, Dict[str, Variant]]) -> None:
+        self.objects[path] = interfaces
+        self.signal("/", OBJECT_MANAGER_IFACE, "InterfacesAdded", "oa{sa{sv}}", [path, interfaces])
+
+    def remove(self, path: str) -> None:
+        interfaces = list(self.objects.pop(path))
+        self.signal("/", OBJECT_MANAGER_IFACE, "InterfacesRemoved", "oas", [path, interfaces])
+
+    def set(self, path: str, interface: str, **changed: Variant) -> None:
+        self.objects[path][interface].update(changed)
+        self.signal(path, PROPERTIES_IFACE, "PropertiesChanged", "sa{sv}as", [interface, changed, []])
+
+    def signal(self, path: str, interface: str, member: str, signature: str, body: list) -> None:
+        self.bus.send(Message.new_signal(path, interface, member, signature, body))
+
+
+async def check(bus_address: str) -> None:
+    loop = asyncio.get_running_loop()
+    bluez = FakeBluez(bus_address)
+    bluez.objects[device_path("AA:BB:CC:DD:EE:01")] = device("AA:BB:CC:DD:EE:01", "Headphones", False)
+    await bluez.start()
+
+    watcher = BluezWatcher(bus_address=bus_address, system_bus=False)
+    assert await loop.run_in_executor(None, watcher.start), f"watcher did not start: {watcher.error!r}"
+    model = watcher.model
+
+    async def wait_for(predicate, what: str) -> None:
+        assert await loop.run_in_executor(None, model.wait_for, predicate, TIMEOUT), f"model missed {what}"
+
+    try:
+        assert model.status()["powered"] and not model.status()["discoverable"], "GetManagedObjects: adapter"
+        assert model.devices() == [("AA:BB:CC:DD:EE:01", "Headphones")], "GetManagedObjects: devices"
+        assert model.info("AA:BB:CC:DD:EE:01")["connected"] is False
+
+        bluez.set(device_path("AA:BB:CC:DD:EE:01"), DEVICE_IFACE, Connected=Variant("b", True))
+        await wait_for(lambda m: m.info("AA:BB:CC:DD:EE:01").get("connected"), "PropertiesChanged")
+        assert model.info("AA:BB:CC:DD:EE:01")["battery"] == 73
+
+        bluez.set(ADAPTER_PATH, ADAPTER_IFACE, Discoverable=Variant("b", True))
+        await wait_for(lambda m: m.status()["discoverable"], "PropertiesChanged of the adapter")
+
+        bluez.add(device_path("AA:BB:CC:DD:EE:02"), device("AA:BB:CC:DD:EE:02", "Mouse", False))
+        await wait_for(lambda m: len(m.devices()) == 2, "InterfacesAdded")
+
+        bluez.remove(device_path("AA:BB:CC:DD:EE:01"))
+        await wait_for(lambda m: m.devices() == [("AA:BB:CC:DD:EE:02", "Mouse")], "InterfacesRemoved")
+        assert model.info("AA:BB:CC:DD:EE:01") == {}
+
+        # signals of other senders are filtered by the watcher's AddMatch rules
+        impostor = await MessageBus(bus_address=bus_address).connect()
+        impostor.send(Message.new_signal(
+            device_path("AA:BB:CC:DD:EE:02"), PROPERTIES_IFACE, "PropertiesChanged", "sa{sv}as",
+            [DEVICE_IFACE, {"Connected": Variant("b", True)}, []],
+        ))
+        version = model.version
+        assert not await loop.run_in_executor(None, model.wait_for, lambda m: m.version != version, 0.3), \
+            "signal of another sender reached the model"
+        impostor.disconnect()
+    finally:
+        await loop.run_in_executor(None, watcher.stop)
+        bluez.bus.disconnect()
+
+
+def run() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        daemon = subprocess.Popen(
+            ["dbus-daemon", "--session", "--nofork", "--print-address=1", f"--address=unix:path={tmp}/bus"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        try:
+            bus_address = daemon.stdout.readline().strip()
+            asyncio.run(check(bus_address))
+        finally:
+            daemon.terminate()
+            daemon.wait()
+    print("BluezWatcher against fake BlueZ: ok")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,48 @@
+"""Parsers for bluetoothctl output"""
+import re
+from typing import Dict, Any, List, Tuple, Optional
+
+BATTERY_PATTERN = re.compile(r'Battery Percentage:.*\((\d+)\)$', re.MULTILINE)
+
+
+def get_field(text: str, key: str) -> Optional[str]:
+    """Returns value of 'key: value' line (None if missing)"""
+    match = re.search(rf'{key}: (.*)$', text, re.MULTILINE)
+    return match.group(1).strip() if match else None
+
+
+def get_flag(text: str, key: str) -> bool:
+    return get_field(text, key) == "yes"
+
+
+def parse_show(text: str) -> Dict[str, Any]:
+    """Parses 'bluetoothctl show'"""
+    return {
+        'powered': get_flag(text, "Powered"),
+        'discoverable': get_flag(text, "Discoverable"),
+        'pairable': get_flag(text, "Pairable"),
+        'scanning': get_flag(text, "Discovering"),
+    }
+
+
+def parse_info(text: str) -> Dict[str, Any]:
+    """Parses 'bluetoothctl info <mac>'"""
+    result = {
+        'name': get_field(text, "Name"),
+        'alias': get_field(text, "Alias"),
+        'connected': get_flag(text, "Connected"),
+        'paired': get_flag(text, "Paired"),
+        'trusted': get_flag(text, "Trusted"),
+    }
+    battery = BATTERY_PATTERN.search(text)
+    result['battery'] = int(battery.group(1)) if battery and result['connected'] else None
+
+    return result
+
+
+def parse_devices(text: str) -> List[Tuple[str, str]]:
+    """
+    Parses 'bluetoothctl devices [Paired|Connected]'
+    Returns [(mac, name) ...]
+    """
+    return [tuple(l.split(" ", maxsplit=2)[1:]) for l in text.splitlines() if l.startswith("Device")]
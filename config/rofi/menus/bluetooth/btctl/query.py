@@ -0,0 +1,87 @@
+"""
+Concurrent bluetoothctl queries
+'show', 'devices Paired' and every 'info <mac>' run at the same time,
+so building the menu costs about one bluetoothctl round trip instead of N
+"""
+import asyncio
+from typing import Dict, Any, List, Iterable
+
+from .cache import get_cache
+from .parse import parse_show, parse_info, parse_devices
+from .watcher import get_watcher
+
+MAX_CONCURRENCY = 8
+
+
+async def run_bluetoothctl(*args: str, timeout: float = 10) -> str:
+    """Async equivalent of run_cmd(['bluetoothctl', ...])[0], query replies go through the TTL cache"""
+    cache = get_cache()
+    reply = cache.get(args)
+    if reply is not None:
+        return reply
+
+    p = await asyncio.create_subprocess_exec(
+        "bluetoothctl", *args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        out, _ = await asyncio.wait_for(p.communicate(), timeout)
+    except asyncio.TimeoutError:
+        p.kill()
+        await p.wait()
+        return ""
+
+    reply = out.decode().strip()
+    if cache.is_query(args):
+        cache.set(args, reply)
+    else:
+        cache.invalidate()
+    return reply
+
+
+async def query_device_info(macs: Iterable[str], max_concurrency: int = MAX_CONCURRENCY) -> Dict[str, Dict[str, Any]]:
+    """Runs 'bluetoothctl info' for all macs, at most 'max_concurrency' at once"""
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def info(mac: str) -> Dict[str, Any]:
+        async with limit:
+            return parse_info(await run_bluetoothctl("info", mac))
+
+    macs = list(macs)
+    results = await asyncio.gather(*(info(mac) for mac in macs))
+    return dict(zip(macs, results))
+
+
+async def query_snapshot(with_info: bool = True, max_concurrency: int = MAX_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Returns {
+        'status': parse_show result,
+        'devices': [(mac, name) ...] of paired devices,
+        'info': {mac: parse_info result} (empty when powered off or with_info=False)
+    }
+    """
+    show, devices = await asyncio.gather(
+        run_bluetoothctl("show"),
+        run_bluetoothctl("devices", "Paired"),
+    )
+    status = parse_show(show)
+    devices = parse_devices(devices)
+
+    info = {}
+    if with_info and status['powered']:
+        info = await query_device_info([mac for mac, _ in devices], max_concurrency)
+
+    return {'status': status, 'devices': devices, 'info': info}
+
+
+def fetch_snapshot(with_info: bool = True, max_concurrency: int = MAX_CONCURRENCY) -> Dict[str, Any]:
+    """Sync wrapper of query_snapshot, reads the D-Bus device model instead when it is available"""
+    watcher = get_watcher()
+    if watcher is not None:
+        return watcher.model.snapshot()
+    return asyncio.run(query_snapshot(with_info, max_concurrency))
+
+
+def fetch_device_info(macs: List[str], max_concurrency: int = MAX_CONCURRENCY) -> Dict[str, Dict[str, Any]]:
+    """Sync wrapper of query_device_info"""
+    return asyncio.run(query_device_info(macs, max_concurrency))
@@ -0,0 +1,165 @@
+"""
+Persistent bluetoothctl session
+One interactive bluetoothctl process answers all queries, replies are read
+from its stdout until a sync marker shows up
+"""
+import atexit
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+from .cache import get_cache
+
+# async D-Bus calls - the interactive shell returns before they finish,
+# so these keep running in their own process (same as before)
+ONE_SHOT_COMMANDS = {"power", "pairable", "discoverable", "scan", "connect", "disconnect", "pair", "remove", "trust",
+                     "untrust"}
+
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]|\x01|\x02')
+PROMPT_PATTERN = re.compile(r'^\[[^\]]*\][#>]\s?')
+EVENT_PREFIXES = ("[CHG]", "[NEW]", "[DEL]")
+# help text printed after "Invalid command", ends up before the next reply
+HINT_PREFIXES = ('Use "',)
+
+
+def run_one_shot(args: List[str], timeout: float = 10) -> str:
+    """Old behaviour - new bluetoothctl process per command"""
+    try:
+        p = subprocess.run(["bluetoothctl", *args], capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return p.stdout.strip()
+
+
+class Bluetoothctl:
+    """Keeps one interactive bluetoothctl process open and sends commands through it"""
+
+    def __init__(self, timeout: float = 5):
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._buffer = b""
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        self._process = subprocess.Popen(
+            ["bluetoothctl"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self._buffer = b""
+        # drop the startup banner ("Agent registered", controller events ...)
+        self._exchange("")
+
+    def close(self) -> None:
+        if not self.alive:
+            return
+        try:
+            self._process.stdin.write(b"quit\n")
+            self._process.stdin.flush()
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._process = None
+
+    def run(self, *args: str) -> str:
+        """Returns stdout of 'bluetoothctl <args>'"""
+        # cli options (--timeout ...) only work on the command line
+        if not args or args[0] in ONE_SHOT_COMMANDS or args[0].startswith("-"):
+            return run_one_shot(list(args))
+
+        with self._lock:
+            try:
+                if not self.alive:
+                    self.start()
+                return self._exchange(" ".join(args))
+            except (OSError, TimeoutError):
+                self.close()
+                return run_one_shot(list(args))
+
+    def _exchange(self, command: str) -> str:
+        """Sends command followed by an invalid command used as sync marker"""
+        self._counter += 1
+        marker = f"rofi_menu_sync_{self._counter}"
+        self._process.stdin.write(f"{command}\n{marker}\n".encode())
+        self._process.stdin.flush()
+
+        # the echoed input line contains the marker too, wait for the error line
+        raw = self._read_until(re.compile(rb'Invalid command[^\n]*' + marker.encode() + rb'[^\n]*\n'))
+        return self._clean(raw.decode(errors="replace"), command)
+
+    def _read_until(self, marker: re.Pattern) -> bytes:
+        fd = self._process.stdout.fileno()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            match = marker.search(self._buffer)
+            if match:
+                head = self._buffer[:match.start()]
+                self._buffer = self._buffer[match.end():]
+                return head
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("bluetoothctl did not answer")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise OSError("bluetoothctl exited")
+            self._buffer += chunk
+
+    @staticmethod
+    def _clean(raw: str, command: str) -> str:
+        lines = []
+        for line in re.split(r'[\r\n]', ANSI_PATTERN.sub("", raw)):
+            line = PROMPT_PATTERN.sub("", line)
+            if not line.strip() or line.startswith(EVENT_PREFIXES + HINT_PREFIXES) or line.strip() == command:
+                continue
+            if "rofi_menu_sync_" in line:  # echoed marker
+                continue
+            lines.append(line)
+        return "\n".join(lines).strip()
+
+
+_controller: Optional[Bluetoothctl] = None
+
+
+def get_controller() -> Bluetoothctl:
+    """Returns shared session, started on first use"""
+    global _controller
+    if _controller is None:
+        _controller = Bluetoothctl()
+        atexit.register(_controller.close)
+    return _controller
+
+
+def run_background(*args: str) -> None:
+    """Starts 'bluetoothctl <args>' without waiting for it (connect, pair ...)"""
+    subprocess.Popen(["bluetoothctl", *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    get_cache().invalidate()
+
+
+def run(*args: str) -> str:
+    """
+    run_cmd(['bluetoothctl', ...])[0] through the shared session
+    Query replies are served from the TTL cache, anything else invalidates it
+    """
+    cache = get_cache()
+    reply = cache.get(args)
+    if reply is not None:
+        return reply
+
+    reply = get_controller().run(*args)
+    if cache.is_query(args):
+        cache.set(args, reply)
+    else:
+        cache.invalidate()
+    return reply
@@ -0,0 +1,229 @@
+"""
+BlueZ D-Bus watcher
+Keeps a device model up to date from PropertiesChanged / InterfacesAdded /
+InterfacesRemoved signals instead of re-polling bluetoothctl.
+Needs dbus-next (python-dbus-next), without it get_watcher() returns None
+and callers fall back to bluetoothctl.
+"""
+import asyncio
+import threading
+from typing import Dict, Any, List, Tuple, Callable, Optional
+
+try:
+    from dbus_next import BusType, Message, MessageType, Variant
+    from dbus_next.aio import MessageBus
+except ImportError:
+    MessageBus = None
+
+BLUEZ_SERVICE = "org.bluez"
+ADAPTER_IFACE = "org.bluez.Adapter1"
+DEVICE_IFACE = "org.bluez.Device1"
+BATTERY_IFACE = "org.bluez.Battery1"
+OBJECT_MANAGER_IFACE = "org.freedesktop.DBus.ObjectManager"
+PROPERTIES_IFACE = "org.freedesktop.DBus.Properties"
+
+
+def unpack(value: Any) -> Any:
+    """Variant -> plain python value"""
+    return value.value if MessageBus is not None and isinstance(value, Variant) else value
+
+
+class DeviceModel:
+    """
+    Thread safe copy of the BlueZ object tree
+    {object_path: {interface: {property: value}}}
+    """
+
+    def __init__(self):
+        self._objects: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._changed = threading.Condition()
+        self.version = 0  # bumped on every change
+
+    # --- updates (watcher thread) ---
+
+    def reset(self, objects: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        with self._changed:
+            self._objects = {}
+            for path, interfaces in objects.items():
+                self._add(path, interfaces)
+            self.version += 1
+            self._changed.notify_all()
+
+    def add(self, path: str, interfaces: Dict[str, Dict[str, Any]]) -> None:
+        with self._changed:
+            self._add(path, interfaces)
+            self.version += 1
+            self._changed.notify_all()
+
+    def remove(self, path: str, interfaces: List[str]) -> None:
+        with self._changed:
+            obj = self._objects.get(path, {})
+            for interface in interfaces:
+                obj.pop(interface, None)
+            if not obj:
+                self._objects.pop(path, None)
+            self.version += 1
+            self._changed.notify_all()
+
+    def update(self, path: str, interface: str, changed: Dict[str, Any], invalidated: List[str]) -> None:
+        with self._changed:
+            props = self._objects.setdefault(path, {}).setdefault(interface, {})
+            props.update({key: unpack(val) for key, val in changed.items()})
+            for key in invalidated:
+                props.pop(key, None)
+            self.version += 1
+            self._changed.notify_all()
+
+    def _add(self, path: str, interfaces: Dict[str, Dict[str, Any]]) -> None:
+        obj = self._objects.setdefault(path, {})
+        for interface, props in interfaces.items():
+            obj.setdefault(interface, {}).update({key: unpack(val) for key, val in props.items()})
+
+    # --- reads (menu thread) ---
+
+    def wait_for(self, predicate: Callable[["DeviceModel"], bool], timeout: float) -> bool:
+        """Blocks until predicate(model) holds or timeout passes, returns the predicate result"""
+        with self._changed:
+            return self._changed.wait_for(lambda: predicate(self), timeout)
+
+    def _with(self, interface: str) -> List[Tuple[str, Dict[str, Any]]]:
+        return sorted((path, obj[interface]) for path, obj in self._objects.items() if interface in obj)
+
+    def status(self) -> Dict[str, Any]:
+        """Same shape as parse_show, first adapter only"""
+        with self._changed:
+            adapters = self._with(ADAPTER_IFACE)
+            props = adapters[0][1] if adapters else {}
+            return {
+                'powered': bool(props.get("Powered")),
+                'discoverable': bool(props.get("Discoverable")),
+                'pairable': bool(props.get("Pairable")),
+                'scanning': bool(props.get("Discovering")),
+            }
+
+    def devices(self, paired: bool = True) -> List[Tuple[str, str]]:
+        """Same shape as parse_devices -> [(mac, name) ...]"""
+        with self._changed:
+            return [
+                (props.get("Address"), props.get("Alias") or props.get("Name") or props.get("Address"))
+                for _, props in self._with(DEVICE_IFACE)
+                if props.get("Paired") or not paired
+            ]
+
+    def info(self, mac: str) -> Dict[str, Any]:
+        """Same shape as parse_info (empty dict for unknown mac)"""
+        with self._changed:
+            for path, props in self._with(DEVICE_IFACE):
+                if props.get("Address") != mac:
+                    continue
+                battery = self._objects[path].get(BATTERY_IFACE, {}).get("Percentage")
+                return {
+                    'name': props.get("Name"),
+                    'alias': props.get("Alias"),
+                    'connected': bool(props.get("Connected")),
+                    'paired': bool(props.get("Paired")),
+                    'trusted': bool(props.get("Trusted")),
+                    'battery': battery if props.get("Connected") else None,
+                }
+            return {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Same shape as query.query_snapshot"""
+        status = self.status()
+        devices = self.devices()
+        info = {mac: self.info(mac) for mac, _ in devices} if status['powered'] else {}
+        return {'status': status, 'devices': devices, 'info': info}
+
+
+class BluezWatcher:
+    """
+    Subscribes to BlueZ signals on a background thread and feeds DeviceModel
+    bus_address/service can point to a stand-in session bus with a fake BlueZ
+    """
+
+    def __init__(self, bus_address: str = None, system_bus: bool = True, service: str = BLUEZ_SERVICE):
+        self.bus_address = bus_address
+        self.system_bus = system_bus
+        self.service = service
+        self.model = DeviceModel()
+        self.error: Optional[Exception] = None
+        self._bus = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self, timeout: float = 2) -> bool:
+        """Starts the watcher thread, returns True once the model is populated"""
+        if MessageBus is None:
+            return False
+        self._thread = threading.Thread(target=self._run, name="bluez-watcher", daemon=True)
+        self._thread.start()
+        return self._ready.wait(timeout) and self.error is None
+
+    def stop(self) -> None:
+        if self._loop is not None and self._bus is not None:
+            self._loop.call_soon_threadsafe(self._bus.disconnect)
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            self.error = e
+        finally:
+            self._ready.set()
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        bus_type = BusType.SYSTEM if self.system_bus else BusType.SESSION
+        self._bus = await MessageBus(bus_address=self.bus_address, bus_type=bus_type).connect()
+
+        # subscribe first, then fetch the tree -> no change gets lost in between
+        for interface in (PROPERTIES_IFACE, OBJECT_MANAGER_IFACE):
+            await self._bus.call(Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="AddMatch",
+                signature="s",
+                body=[f"type='signal',sender='{self.service}',interface='{interface}'"],
+            ))
+        self._bus.add_message_handler(self._on_message)
+
+        reply = await self._bus.call(Message(
+            destination=self.service, path="/", interface=OBJECT_MANAGER_IFACE, member="GetManagedObjects",
+        ))
+        if reply.message_type == MessageType.ERROR:
+            raise RuntimeError(f"GetManagedObjects failed: {reply.error_name}")
+        self.model.reset(reply.body[0])
+
+        self._ready.set()
+        await self._bus.wait_for_disconnect()
+
+    def _on_message(self, msg: "Message") -> None:
+        if msg.message_type != MessageType.SIGNAL:
+            return
+        if msg.interface == PROPERTIES_IFACE and msg.member == "PropertiesChanged":
+            interface, changed, invalidated = msg.body
+            self.model.update(msg.path, interface, changed, invalidated)
+        elif msg.interface == OBJECT_MANAGER_IFACE and msg.member == "InterfacesAdded":
+            path, interfaces = msg.body
+            self.model.add(path, interfaces)
+        elif msg.interface == OBJECT_MANAGER_IFACE and msg.member == "InterfacesRemoved":
+            path, interfaces = msg.body
+            self.model.remove(path, interfaces)
+
+
+_watcher: Optional[BluezWatcher] = None
+
+
+def get_watcher() -> Optional[BluezWatcher]:
+    """Returns shared running watcher, None if D-Bus is not usable"""
+    global _watcher
+    if _watcher is None:
+        _watcher = BluezWatcher()
+        if not _watcher.start():
+            _watcher.stop()
+            _watcher = False
+    return _watcher or None
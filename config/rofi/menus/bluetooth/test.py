@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 import sys
+
+sys.path.append("/home/truepeak/.config/rofi")
+import rofi_menu_client
+
+if rofi_menu_client.forward():  # a running daemon answered, skip the heavy imports
+    sys.exit(0)
+
 import subprocess
+import time
 import re
 from typing import Dict, Any, List, Tuple
 
-sys.path.append("/home/truepeak/.config/rofi")
 import rofi_menu
+import btctl
 
 OFFSET = 18
 
@@ -26,16 +34,8 @@ BATTERY_MAP = {
 
 
 def get_bluetoothctl_status() -> Dict[str, Any]:
-    status_string, _ = rofi_menu.run_cmd("bluetoothctl show")
-    result = {}
-    result['powered'] = True if re.search(r'Powered: (.*)$', status_string, re.MULTILINE).group(1) == "yes" else False
-    result['discoverable'] = True if re.search(r'Discoverable: (.*)$', status_string, re.MULTILINE).group(
-        1) == "yes" else False
-    result['pairable'] = True if re.search(r'Pairable: (.*)$', status_string, re.MULTILINE).group(1) == "yes" else False
-    result['scanning'] = True if re.search(r'Discovering: (.*)$', status_string, re.MULTILINE).group(
-        1) == "yes" else False
-
-    return result
+    status_string = btctl.run("show")
+    return btctl.parse_show(status_string)
 
 
 class BluetoothToggleItem(rofi_menu.Item):
@@ -46,7 +46,7 @@ class BluetoothToggleItem(rofi_menu.Item):
 
     def on_select(self, **kwargs):
         action = "off" if self.status else "on"
-        out, _ = rofi_menu.run_cmd(f"bluetoothctl power {action}")
+        btctl.run("power", action)
         self.status = get_bluetoothctl_status()['powered']
         self.set_text()
         self._main_menu.reload()
@@ -67,7 +67,7 @@ class DiscoverableToggleItem(rofi_menu.Item):
 
     def on_select(self, **kwargs):
         action = "off" if self.status else "on"
-        out, _ = rofi_menu.run_cmd(f"bluetoothctl discoverable {action}")
+        btctl.run("discoverable", action)
         self.status = get_bluetoothctl_status()['discoverable']
         self.set_text()
         return rofi_menu.SelectOutcome.REFRESH
@@ -87,7 +87,7 @@ class PairableToggleItem(rofi_menu.Item):
 
     def on_select(self, **kwargs):
         action = "off" if self.status else "on"
-        out, _ = rofi_menu.run_cmd(f"bluetoothctl pairable {action}")
+        btctl.run("pairable", action)
         self.status = get_bluetoothctl_status()['pairable']
         self.set_text()
         return rofi_menu.SelectOutcome.REFRESH
@@ -107,12 +107,33 @@ class DeviceConnectToggleItem(rofi_menu.SubMenuItem):
         self.mac = kwargs.get("mac")
         self.wait = 0
         self.set_text()
-        self._items = [rofi_menu.WaitItem(text="Connecting: ")]
+        self._items = [rofi_menu.WaitItem(text="Connecting: ", wait_for=self.wait_connected)]
 
     def on_select(self, **kwargs):
-        super().on_select(**kwargs)
+        if len(kwargs.get("id_list", [])) == 1:  # entering -> start (dis)connecting
+            btctl.run_background("disconnect" if self.status else "connect", self.mac)
+        outcome = super().on_select(**kwargs)
         if self._items[0].cooldown == 0:
             pid, _ = rofi_menu.run_cmd(['sh', '-c', 'sleep 0.5 && wtype -k Return'], background=True)
+        return outcome
+
+    def wait_connected(self, timeout: float) -> bool:
+        """
+        Returns True once BlueZ reports the new connection state (plain sleep without D-Bus)
+        and shows it here and in the device row, the tree outlives this rofi call
+        """
+        watcher = btctl.get_watcher()
+        if watcher is None:
+            time.sleep(timeout)
+            return False
+        target = not self.status
+        if not watcher.model.wait_for(lambda model: model.info(self.mac).get('connected') == target, timeout):
+            return False
+        self.status = target
+        self.set_text()
+        device = self._parent_menu
+        device.set_device_info(watcher.model.info(self.mac) or {**device.device_info, 'connected': target})
+        return True
 
     def set_text(self):
         if self.status:
@@ -123,73 +144,83 @@ class DeviceConnectToggleItem(rofi_menu.SubMenuItem):
 
 class DeviceMenuItem(rofi_menu.SubMenuItem):
     def __init__(self, **kwargs):
+        kwargs['items_factory'] = self.build_items
         super().__init__(**kwargs)
         self.name = kwargs.get("name")
         self.mac = kwargs.get("mac")
-        self.device_info = self.get_device_info()
+        self.set_device_info(kwargs.get("device_info") or self.get_device_info())
+
+    def set_device_info(self, device_info: Dict[str, Any]) -> None:
+        self.device_info = device_info
         battery = self.device_info["battery"]
-        if battery:
-            battery = int(battery) - int(battery) % 10
+        if battery is not None:
+            battery = battery - battery % 10
         icon = '󰋋' if self.device_info["connected"] else "󰟎"
         self.text = f"{icon + '  ' + self.name:<{OFFSET}}{BATTERY_MAP[battery]}"
-        self._items = [
+        if isinstance(self._parent_menu, DevicesMenuItem):  # rebuilt rows start from the new state
+            self._parent_menu._device_info[self.mac] = device_info
+
+    def build_items(self) -> List[rofi_menu.Item]:
+        return [
             rofi_menu.ReturnItem(),
             DeviceConnectToggleItem(status=self.device_info["connected"], mac=self.mac)
         ]
 
     def get_device_info(self) -> Dict[str, Any]:
-        info_string, _ = rofi_menu.run_cmd(f"bluetoothctl info {self.mac}")
-
-        result = {
-            'connected': True if re.search(r'Connected: (.*)$', info_string, re.MULTILINE).group(1) == 'yes' else False,
-            'paired': True if re.search(r'Connected: (.*)$', info_string, re.MULTILINE).group(1) == 'yes' else False,
-            'trusted': True if re.search(r'Connected: (.*)$', info_string, re.MULTILINE).group(1) == 'yes' else False,
-        }
-        result['battery'] = re.search(r'Battery Percentage:.*\((.*)\)$', info_string, re.MULTILINE).group(1) if result[
-            'connected'] else None
-
-        return result
+        info_string = btctl.run("info", self.mac)
+        return btctl.parse_info(info_string)
 
 
 class DevicesMenuItem(rofi_menu.SubMenuItem):
     def __init__(self, **kwargs):
+        # device items (and their 'bluetoothctl info' calls) are built only when the submenu is entered
+        kwargs['items_factory'] = self.build_items
         super().__init__(**kwargs)
-        self._items: List[rofi_menu.Item] = [
+        self._devices = kwargs.get("devices")
+        if self._devices is None:
+            self._devices = self.get_devices()
+        self._device_info = kwargs.get("device_info") or {}
+
+        num_devices = f"[{len(self._devices)}]"
+        self.text = f"{self.text:<{OFFSET}}{num_devices}"
+
+    def build_items(self) -> List[rofi_menu.Item]:
+        missing = [mac for mac, _ in self._devices if mac not in self._device_info]
+        if missing:
+            self._device_info.update(btctl.fetch_device_info(missing))
+
+        items: List[rofi_menu.Item] = [
             rofi_menu.ReturnItem(),
         ]
-        self._items.extend([
-            DeviceMenuItem(mac=mac, name=name)
-            for mac, name in self.get_devices()
+        items.extend([
+            DeviceMenuItem(mac=mac, name=name, device_info=self._device_info.get(mac))
+            for mac, name in self._devices
         ])
-        num_devices = f"[{len(self._items) - 1}]"
-        self.text = f"{self.text:<{OFFSET}}{num_devices}"
-
-        self._items.extend(
-            [rofi_menu.Item(text=("󰐷 Scan"))]
-        )
+        items.append(rofi_menu.Item(text=("󰐷 Scan")))
+        return items
 
     @staticmethod
     def get_devices() -> List[Tuple]:
         """
         Returns [(mac, name) ...]
         """
-        info_string, _ = rofi_menu.run_cmd("bluetoothctl devices Paired")
-        devices = [tuple(l.split(" ", maxsplit=2)[1:]) for l in info_string.splitlines() if l.startswith("Device")]
-
-        return devices
+        info_string = btctl.run("devices", "Paired")
+        return btctl.parse_devices(info_string)
 
 
 class BluetoothMenu(rofi_menu.Menu):
     def __init__(self, **kwargs):
-        self.status = get_bluetoothctl_status()
-        
+        # show and devices are queried concurrently, device info waits until the submenu is entered
+        snapshot = btctl.fetch_snapshot(with_info=False)
+        self.status = snapshot['status']
+
         super().__init__(**kwargs)
-        
+
         if self.status['powered']:
             self._items = [
                 rofi_menu.ExitItem(),
                 BluetoothToggleItem(self.status['powered']),
-                DevicesMenuItem(text="󰋋  Devices"),
+                DevicesMenuItem(text="󰋋  Devices", devices=snapshot['devices'], device_info=snapshot['info']),
                 DiscoverableToggleItem(status=self.status['discoverable']),
                 PairableToggleItem(status=self.status['pairable']),
                 rofi_menu.WaitItem(text="Lol")
@@ -201,6 +232,4 @@ class BluetoothMenu(rofi_menu.Menu):
             ]
 
 
-menu = BluetoothMenu()
-
-rofi_menu.run_menu(menu)
+rofi_menu.run_menu_daemon(BluetoothMenu)
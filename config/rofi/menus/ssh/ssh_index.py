@@ -0,0 +1,281 @@
+"""
+Host index of the SSH menu
+Merges rofi_menu.toml, ~/.ssh/config (and the files it Includes) and
+known_hosts into one host list, de-duplicated by (user, host, port).
+The index is marshalled under ~/.cache with the mtime and size of every
+source file: only changed files are parsed again, and while no file
+changed the merged list is returned as stored
+"""
+import fnmatch
+import getpass
+import glob
+import marshal
+import os
+import re
+import shlex
+import tomllib
+
+from typing import Any, Dict, List, Optional, Tuple
+
+INDEX_VERSION = 1
+DEFAULT_PORT = 22
+MAX_INCLUDE_DEPTH = 16  # same limit as ssh, stops include loops
+WILDCARD_CHARS = "*?!"
+
+Host = Dict[str, Any]  # entry_config of SSHEntry
+KEYWORD = re.compile(r"(\w+)\s*(?:=\s*|\s+)(.*)")
+
+
+def make_host(identifier: str, username: Optional[str], hostname: str, port: int = DEFAULT_PORT,
+              ssh_key: Optional[str] = None, alias: Optional[str] = None) -> Host:
+    return {"identifier": identifier, "username": username, "hostname": hostname,
+            "port": port, "ssh_key": ssh_key, "alias": alias}
+
+
+def parse_inventory(raw: bytes) -> List[Host]:
+    """Validated [[ssh]] tables of rofi_menu.toml"""
+    config = tomllib.loads(raw.decode())
+    return [
+        make_host(str(e["identifier"]), str(e["username"]), str(e["hostname"]), int(e["port"]), str(e["ssh_key"]))
+        for e in config.get("ssh", [])
+    ]
+
+
+def parse_ssh_config(raw: bytes) -> List[Tuple[str, List[str]]]:
+    """(lower-case keyword, arguments) of every line, Includes are resolved by SSHIndex"""
+    statements = []
+    for line in raw.decode(errors="replace").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        m = KEYWORD.match(line)
+        if m is None:
+            continue
+        value = m.group(2)
+        if '"' in value or "'" in value or "#" in value:
+            try:
+                args = shlex.split(value, comments=True)
+            except ValueError:  # unbalanced quotes
+                args = value.split()
+        else:  # shlex is slow, most lines have nothing to unquote
+            args = value.split()
+        if args:
+            statements.append((m.group(1).lower(), args))
+    return statements
+
+
+def parse_known_hosts(raw: bytes) -> List[Host]:
+    """First name of every plain known_hosts line, hashed names and @markers can't be listed"""
+    hosts = []
+    for line in raw.decode(errors="replace").splitlines():
+        line = line.strip()
+        if not line or line[0] in "#@|":
+            continue
+        name = line.split(None, 1)[0].split(",")[0]
+        if any(char in name for char in WILDCARD_CHARS):
+            continue
+        port = DEFAULT_PORT
+        if name.startswith("[") and "]:" in name:
+            name, _, port_text = name[1:].partition("]:")
+            if not port_text.isdigit():
+                continue
+            port = int(port_text)
+        identifier = name if port == DEFAULT_PORT else f"{name}:{port}"
+        hosts.append(make_host(identifier, None, name, port))
+    return hosts
+
+
+def host_matches(patterns: List[str], name: str) -> bool:
+    """ssh's Host matching: any pattern matches and no negated one does"""
+    matched = False
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        if fnmatch.fnmatchcase(name.lower(), pattern.lstrip("!").lower()):
+            if negated:
+                return False
+            matched = True
+    return matched
+
+
+def config_hosts(statements: List[Tuple[str, List[str]]]) -> List[Host]:
+    """
+    One host per concrete Host alias, with the options of every block
+    matching it (first value wins, like ssh). Blocks without wildcards are
+    looked up by alias, only wildcard blocks are matched against every alias
+    """
+    blocks: List[Tuple[Optional[List[str]], Dict[str, List[str]]]] = [(["*"], {})]  # options before any Host
+    for keyword, args in statements:
+        if keyword == "host":
+            blocks.append((args, {}))
+        elif keyword == "match":  # conditions ssh evaluates at connect time, not listable
+            blocks.append((None, {}))
+        else:
+            blocks[-1][1].setdefault(keyword, args)
+
+    aliases: Dict[str, List[int]] = {}
+    wildcard_blocks = []
+    for i, (patterns, _) in enumerate(blocks):
+        if patterns is None:
+            continue
+        if any(char in pattern for pattern in patterns for char in WILDCARD_CHARS):
+            wildcard_blocks.append(i)
+        for pattern in patterns:
+            if not any(char in pattern for char in WILDCARD_CHARS):
+                aliases.setdefault(pattern, []).append(i)
+
+    hosts = []
+    for alias, exact in aliases.items():
+        options: Dict[str, List[str]] = {}
+        matching = set(exact) | {i for i in wildcard_blocks if host_matches(blocks[i][0], alias)}
+        for i in sorted(matching):
+            for keyword, args in blocks[i][1].items():
+                options.setdefault(keyword, args)
+        port = options.get("port", [str(DEFAULT_PORT)])[0]
+        hosts.append(make_host(
+            alias,
+            options.get("user", [None])[0],
+            options.get("hostname", [alias])[0].replace("%h", alias),
+            int(port) if port.isdigit() else DEFAULT_PORT,
+            options.get("identityfile", [None])[0],
+            alias,
+        ))
+    return hosts
+
+
+def merge_hosts(inventory: List[Host], config: List[Host], known: List[Host], default_user: str) -> List[Host]:
+    """
+    Inventory first, then ~/.ssh/config, de-duplicated by (user, host, port)
+    known_hosts has no users, its hosts are only added if no entry has their (host, port)
+    """
+    merged: Dict[Tuple[str, str, int], Host] = {}
+    for host in inventory + config:
+        merged.setdefault((host["username"] or default_user, host["hostname"].lower(), host["port"]), host)
+    covered = {(hostname, port) for _, hostname, port in merged}
+    for host in known:
+        key = (host["hostname"].lower(), host["port"])
+        if key not in covered:
+            covered.add(key)
+            merged[(default_user, *key)] = host
+    return list(merged.values())
+
+
+class SSHIndex:
+    """
+    Persistent merged host list
+    Index file = marshalled {"schema", "signature": [[path, mtime_ns, size]...],
+    "globs": {Include pattern: matches}, "hosts", "state": marshalled {"files": {path:
+    [mtime_ns, size, parsed]}, "config": [signature of the config files, their hosts]}}.
+    Missing sources are in the signature too, so creating one is noticed. The state is
+    only unmarshalled once a source changed
+    """
+
+    def __init__(self, path: str, inventory: str, ssh_config: str, known_hosts: str):
+        self.path = path
+        self.inventory = inventory
+        self.ssh_config = ssh_config
+        self.known_hosts = known_hosts
+        self.ssh_dir = os.path.dirname(ssh_config)
+        self._old_files: Dict[str, list] = {}
+        self._files: Dict[str, list] = {}
+        self._globs: Dict[str, List[str]] = {}
+
+    def hosts(self) -> List[Host]:
+        cached = self._read()
+        if cached is not None and self._unchanged(cached):
+            return cached["hosts"]
+
+        state = marshal.loads(cached["state"]) if cached is not None else {"files": {}, "config": [None, []]}
+        self._old_files = state["files"]
+        self._files, self._globs = {}, {}
+        statements = self._config_statements(self.ssh_config, 0)
+        config_signature = self._signature()
+        if state["config"][0] == config_signature:
+            config = state["config"][1]  # only the inventory or known_hosts changed
+        else:
+            config = config_hosts(statements)
+        inventory = self._parsed(self.inventory, parse_inventory)
+        known = self._parsed(self.known_hosts, parse_known_hosts)
+        hosts = merge_hosts(inventory, config, known, getpass.getuser())
+
+        self._write({
+            "schema": self.schema(),
+            "signature": self._signature(),
+            "globs": self._globs,
+            "hosts": hosts,
+            "state": marshal.dumps({"files": self._files, "config": [config_signature, config]}),
+        })
+        return hosts
+
+    def _unchanged(self, cached: dict) -> bool:
+        """True if no source was changed, created or removed and every Include matches the same files"""
+        for path, mtime, size in cached["signature"]:
+            if self._stat(path) != (mtime, size):
+                return False
+        return all(sorted(glob.glob(pattern)) == matches for pattern, matches in cached["globs"].items())
+
+    def _signature(self) -> List[list]:
+        return [[path, mtime, size] for path, (mtime, size, _) in self._files.items()]
+
+    @staticmethod
+    def _stat(path: str) -> Tuple[int, int]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return -1, -1
+        return stat.st_mtime_ns, stat.st_size
+
+    def _parsed(self, path: str, parser) -> Any:
+        """Parsed file, reused from the index while its mtime and size are unchanged"""
+        mtime, size = self._stat(path)
+        old = self._old_files.get(path)
+        if mtime < 0:
+            parsed = []
+        elif old is not None and old[:2] == [mtime, size]:
+            parsed = old[2]
+        else:
+            with open(path, 'rb') as f:
+                parsed = parser(f.read())
+        self._files[path] = [mtime, size, parsed]
+        return parsed
+
+    def _config_statements(self, path: str, depth: int) -> List[Tuple[str, List[str]]]:
+        """Statements of path with Include lines replaced by the included files'"""
+        statements = []
+        for keyword, args in self._parsed(path, parse_ssh_config):
+            if keyword != "include":
+                statements.append((keyword, args))
+                continue
+            if depth >= MAX_INCLUDE_DEPTH:
+                continue
+            for pattern in args:
+                pattern = os.path.join(self.ssh_dir, os.path.expanduser(pattern))  # relative to ~/.ssh
+                self._globs[pattern] = sorted(glob.glob(pattern))
+                for included in self._globs[pattern]:
+                    statements.extend(self._config_statements(included, depth + 1))
+        return statements
+
+    @staticmethod
+    def schema() -> list:
+        """Changes with this module, so stored parse results never outlive the parsers"""
+        return [INDEX_VERSION, os.stat(__file__).st_mtime_ns]
+
+    def _read(self) -> Optional[dict]:
+        try:
+            with open(self.path, 'rb') as f:
+                cached = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(cached, dict) or cached.get("schema") != self.schema():
+            return None
+        return cached
+
+    def _write(self, cached: dict) -> None:
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(marshal.dumps(cached))
+            os.replace(tmp_path, self.path)
+        except (OSError, ValueError):  # unwritable cache dir, parse every time
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+ControlMaster connections of the SSH menu
+Sessions opened from the menu share one multiplexed connection per host
+(ControlMaster=auto + ControlPersist), and the most used hosts get their
+master connected in the background whenever the menu is built, so selecting
+them skips the TCP, key exchange and auth round trips.
+Sockets live in ~/.cache/rofi_menu/ssh_masters under hashed names, unix
+socket paths are limited to 108 bytes
+
+Manual use (ex. against a local sshd on localhost):
+python3 ssh_master.py status | warm [N] | stop
+python3 ssh_master.py check [SSH ARGS ...]  (default localhost, needs key auth)
+"""
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Dict, List
+
+CACHE_DIR = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+MASTER_DIR = os.path.join(CACHE_DIR, "rofi_menu", "ssh_masters")
+USAGE_PATH = os.path.join(MASTER_DIR, "usage.json")
+
+CONTROL_PERSIST = "30m"  # idle time before a master exits
+WARM_TOP = 5  # most used hosts kept warm
+CONNECT_TIMEOUT = 5
+WARMING_GRACE = CONNECT_TIMEOUT + 5  # a started master has this long to create its socket
+
+
+class Master:
+    """ControlMaster of one ssh target (the arguments after 'ssh')"""
+
+    def __init__(self, target: List[str], directory: str = MASTER_DIR):
+        self.target = target
+        self.key = " ".join(target)
+        self.directory = directory
+        self.path = os.path.join(directory, hashlib.sha1(self.key.encode()).hexdigest()[:16])
+
+    def options(self, control_master: str = "auto") -> List[str]:
+        """ssh options reusing the live master, or making this session the master"""
+        return [
+            "-o", f"ControlMaster={control_master}",
+            "-o", f"ControlPath={self.path}",
+            "-o", f"ControlPersist={CONTROL_PERSIST}",
+        ]
+
+    def is_live(self) -> bool:
+        """A live master accepts connections on its socket, a stale socket file refuses them"""
+        if not os.path.exists(self.path):
+            return False
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.path)
+            except OSError:
+                return False
+        return True
+
+    def warm(self) -> bool:
+        """Connects a master in the background unless one is live or connecting, True if started"""
+        if self.is_live() or self.is_warming():
+            return False
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with open(f"{self.path}.warming", "w"):
+            pass
+        subprocess.Popen(
+            ["ssh", "-N", "-f", *self.options("yes"),
+             "-o", "BatchMode=yes", "-o", f"ConnectTimeout={CONNECT_TIMEOUT}", *self.target],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,  # outlives the menu script
+        )
+        return True
+
+    def is_warming(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(f"{self.path}.warming") < WARMING_GRACE
+        except OSError:
+            return False
+
+    def stop(self) -> None:
+        subprocess.run(["ssh", "-o", f"ControlPath={self.path}", "-O", "exit", *self.target],
+                       capture_output=True, timeout=CONNECT_TIMEOUT)
+
+
+class Usage:
+    """How often every ssh target was opened from the menu"""
+
+    def __init__(self, path: str = USAGE_PATH):
+        self.path = path
+        self.data: Dict[str, Dict] = {}  # key -> {"count", "target"}
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def record(self, master: Master) -> None:
+        entry = self.data.setdefault(master.key, {"count": 0})
+        entry["count"] += 1
+        entry["target"] = master.target
+        self.save()
+
+    def top(self, count: int = WARM_TOP) -> List[Master]:
+        ranked = sorted(self.data.values(), key=lambda entry: entry["count"], reverse=True)
+        return [Master(entry["target"], os.path.dirname(self.path)) for entry in ranked[:count]]
+
+    def save(self) -> None:
+        """Atomic rename, like rofi_menu.Store"""
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+
+def warm_top(count: int = WARM_TOP) -> None:
+    """Starts the missing masters of the most used hosts, never waits for them"""
+    for master in Usage().top(count):
+        master.warm()
+
+
+def wait_live(master: Master, live: bool = True) -> bool:
+    deadline = time.time() + WARMING_GRACE
+    while master.is_live() != live:
+        if time.time() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def check(target: List[str]) -> None:
+    """
+    Connects masters to 'target' in a temporary directory and checks that
+    warm(), is_live() and the session options connect and get reused
+    """
+    quiet = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+
+    def session(*options: str) -> bool:
+        # no pipes: a session that becomes the master lives on in the background
+        return subprocess.run(["ssh", *options, "-o", "BatchMode=yes", *target, "true"],
+                              timeout=CONNECT_TIMEOUT + 5, **quiet).returncode == 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        master = Master(target, directory)
+        try:
+            assert not master.is_live(), "live master before warm()"
+            assert master.warm(), "warm() did not start a master"
+            assert not master.warm(), "warm() started a second master while connecting"
+            assert wait_live(master), "warmed master never accepted connections"
+            # a session through the master opens no connection, so ProxyCommand=false can't fail it
+            assert session(*master.options(), "-o", "ProxyCommand=false"), "session did not reuse the master"
+            master.stop()
+            assert wait_live(master, False), "stop() left the master running"
+
+            # without a master the first session connects and stays as the master (ControlPersist)
+            assert session(*master.options()), "session without a master failed"
+            assert wait_live(master), "first session did not become the master"
+            assert session(*master.options(), "-o", "ProxyCommand=false"), "second session did not reuse it"
+        finally:
+            master.stop()
+    print(f"ControlMaster against {' '.join(target)}: ok")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "check":
+        check(sys.argv[2:] or ["localhost"])
+        sys.exit(0)
+    if command == "warm":
+        warm_top(int(sys.argv[2]) if len(sys.argv) > 2 else WARM_TOP)
+    for entry in Usage().data.values():
+        master = Master(entry["target"])
+        if command == "stop":
+            master.stop()
+        elif command == "status":
+            state = "live" if master.is_live() else "warming" if master.is_warming() else "-"
+            print(f"{entry['count']:>5}  {state:<8} {master.key}")
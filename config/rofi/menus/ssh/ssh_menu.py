@@ -1,14 +1,67 @@
 #!/usr/bin/env python3
-from typing import List
-import tomllib
+from typing import List, Optional
+import glob
 import os
+import shlex
+import shutil
+import stat
+import subprocess
 import sys
 
 sys.path.append("/home/truepeak/.config/rofi")
 import rofi_menu
+from ssh_index import SSHIndex
+from ssh_master import Master, Usage, warm_top
+from ssh_probe import ProbeCache, probe_in_background
 
 USER_HOME = f"/home/{os.getlogin()}"
 SSH_CONFIG_PATH = f"{USER_HOME}/.ssh/rofi_menu.toml"
+SSH_INDEX_PATH = f"{os.environ.get('XDG_CACHE_HOME', f'{USER_HOME}/.cache')}/rofi_menu/ssh_index"
+
+KITTY_SOCKET_NAME = "kitty-"  # listen_on unix:${XDG_RUNTIME_DIR}/kitty in kitty.conf, kitty appends -<pid>
+KITTY_LAUNCH_TYPE = "os-window"  # or "tab" (in the active OS window)
+LIVE_MASTER_MARK = "  󱘖"  # host with a connected ControlMaster
+
+
+def kitty_sockets() -> List[str]:
+    """
+    Remote control sockets of the current user's kitty instances, newest first
+    Only $XDG_RUNTIME_DIR is searched: the ssh command line must not reach another user's kitty
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        return []
+    sockets = []
+    for path in glob.glob(os.path.join(glob.escape(runtime_dir), f"{KITTY_SOCKET_NAME}*")):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid():
+            sockets.append(path)
+
+    def pid(path: str) -> int:
+        suffix = os.path.basename(path)[len(KITTY_SOCKET_NAME):]
+        return int(suffix) if suffix.isdigit() else 0
+
+    return sorted(sockets, key=pid, reverse=True)
+
+
+def open_in_kitty(title: str, command: str) -> bool:
+    """Runs command in a new window of a running kitty, False if none took it"""
+    kitten = "kitten" if shutil.which("kitten") else "kitty"  # kitten starts much faster
+    for socket in kitty_sockets():
+        try:
+            window_id, _ = rofi_menu.run_cmd(
+                [kitten, "@", "--to", f"unix:{socket}", "launch", f"--type={KITTY_LAUNCH_TYPE}",
+                 "--title", title, "--hold", "sh", "-c", command],
+                timeout=2,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if window_id.isdigit():
+            return True
+    return False
 
 
 class SSHEntry(rofi_menu.Item):
@@ -16,32 +69,60 @@ class SSHEntry(rofi_menu.Item):
         super().__init__(**kwargs)
         entry_config = kwargs.get("entry_config")
         self.identifier: str = entry_config["identifier"]
-        self.username: str = entry_config["username"]
+        self.username: Optional[str] = entry_config.get("username")
         self.hostname: str = entry_config["hostname"]
-        self.port: int = entry_config["port"]
-        self.sshkey: str = entry_config["ssh_key"]
-        self.sshkey.replace("~", USER_HOME)
+        self.port: int = entry_config.get("port", 22)
+        self.sshkey: Optional[str] = entry_config.get("ssh_key")
+        if self.sshkey:
+            self.sshkey = self.sshkey.replace("~", USER_HOME)
+        self.alias: Optional[str] = entry_config.get("alias")  # Host of ~/.ssh/config
+        self._master = Master(self.ssh_target())
 
-        self.text = f"󰢹  {self.identifier}"
+        self.text = f"󰢹  {self.identifier}" + (LIVE_MASTER_MARK if self._master.is_live() else "")
+        probed, latency = kwargs.get("probe", (False, None))  # ProbeCache.get result
+        if probed:
+            self.text += f"  {latency:.0f} ms" if latency is not None else "  down"
+
+    def ssh_target(self) -> List[str]:
+        if self.alias:  # ssh applies the alias' options (ProxyJump etc.) itself
+            return [self.alias]
+        target = f"{self.username}@{self.hostname}" if self.username else self.hostname
+        return [target, "-p", str(self.port)] + (["-i", self.sshkey] if self.sshkey else [])
+
+    def ssh_args(self) -> str:
+        """Target behind the host's ControlMaster (quoted for sh -c), the first session becomes the master"""
+        return shlex.join(self._master.options() + self.ssh_target())
 
     def on_select(self, **kwargs):
-        ssh_command = f"TERM=xterm-256color ssh {self.username}@{self.hostname} -p {self.port} -i {self.sshkey}"
-        rofi_menu.run_cmd(['kitty', '--title', f'󰢹  {self.identifier}', '--hold', 'sh', '-c', ssh_command], background=True)
+        Usage().record(self._master)
+        ssh_command = f"TERM=xterm-256color ssh {self.ssh_args()}"
+        title = f'󰢹  {self.identifier}'
+        if not open_in_kitty(title, ssh_command):  # no kitty running, start one
+            rofi_menu.run_cmd(['kitty', '--title', title, '--hold', 'sh', '-c', ssh_command], background=True)
         return rofi_menu.SelectOutcome.EXIT
 
 
 def parse_config() -> List[SSHEntry]:
-    with open(SSH_CONFIG_PATH, "rb") as f:
-        config = tomllib.load(f)
-    entries = config.get("ssh")
-    entries = [SSHEntry(entry_config=e) for e in entries]
-    return entries
+    index = SSHIndex(
+        SSH_INDEX_PATH,
+        inventory=SSH_CONFIG_PATH,
+        ssh_config=f"{USER_HOME}/.ssh/config",
+        known_hosts=f"{USER_HOME}/.ssh/known_hosts",
+    )
+    hosts = index.hosts()
+    probes = ProbeCache()
+    probe_in_background([(e["hostname"], e["port"]) for e in hosts], probes)  # shown next time
+    return [SSHEntry(entry_config=e, probe=probes.get(e["hostname"], e["port"])) for e in hosts]
 
 
-if __name__ == "__main__":
+def build_menu() -> rofi_menu.Menu:
     items: List[rofi_menu.Item] = [
         rofi_menu.ExitItem(),
     ]
     items.extend(parse_config())
-    main_menu = rofi_menu.Menu(items=items, message="󰌘  SSH MANAGER")
-    rofi_menu.run_menu(main_menu)
+    warm_top()  # background masters for the most used hosts
+    return rofi_menu.Menu(items=items, message="󰌘  SSH MANAGER")
+
+
+if __name__ == "__main__":
+    rofi_menu.run_menu(build_menu)
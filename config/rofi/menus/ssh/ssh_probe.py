@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Reachability of the SSH menu's hosts
+TCP connect times to every hostname:port are measured concurrently (asyncio,
+at most MAX_PROBES at once) by a detached process, the menu only reads the
+results from a short lived cache in ~/.cache/rofi_menu, so building and
+rendering it never waits on the network
+
+Manual use (ex. against local listening sockets):
+python3 ssh_probe.py HOST:PORT ...
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+PROBE_DIR = os.path.join(CACHE_DIR, "rofi_menu")
+PROBE_PATH = os.path.join(PROBE_DIR, "ssh_probe.json")
+
+PROBE_TTL = 60  # seconds a result is shown and not probed again
+PROBE_TIMEOUT = 2.0  # connect time after which a host counts as down
+MAX_PROBES = 64  # concurrent connects
+MAX_PROBE_RUN = 120  # a prober older than this is assumed dead
+
+Target = Tuple[str, int]
+
+
+def probe_key(hostname: str, port: int) -> str:
+    return f"{hostname}:{port}"
+
+
+async def probe(hostname: str, port: int, timeout: float = PROBE_TIMEOUT) -> Optional[float]:
+    """TCP connect time in ms, None if refused, unresolvable or slower than timeout"""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(hostname, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    latency = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latency
+
+
+async def probe_all(targets: List[Target], limit: int = MAX_PROBES,
+                    timeout: float = PROBE_TIMEOUT) -> Dict[str, Optional[float]]:
+    """probe_key -> latency of every target, at most 'limit' connects in flight"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(hostname: str, port: int) -> Optional[float]:
+        async with semaphore:
+            return await probe(hostname, port, timeout)
+
+    latencies = await asyncio.gather(*(bounded(hostname, port) for hostname, port in targets))
+    return {probe_key(hostname, port): latency for (hostname, port), latency in zip(targets, latencies)}
+
+
+class ProbeCache:
+    """probe_key -> [probe time, latency in ms or None (down)]"""
+
+    def __init__(self, path: str = PROBE_PATH, ttl: float = PROBE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.data: Dict[str, list] = {}
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, hostname: str, port: int) -> Tuple[bool, Optional[float]]:
+        """(known, latency) of a result younger than ttl"""
+        result = self.data.get(probe_key(hostname, port))
+        if result is None or time.time() - result[0] > self.ttl:
+            return False, None
+        return True, result[1]
+
+    def stale(self, targets: List[Target]) -> List[Target]:
+        return [target for target in dict.fromkeys(targets) if not self.get(*target)[0]]
+
+    def update(self, latencies: Dict[str, Optional[float]]) -> None:
+        now = time.time()
+        for key, latency in latencies.items():
+            self.data[key] = [now, latency]
+        # results nobody asked for again expire for good
+        self.data = {key: result for key, result in self.data.items() if now - result[0] < 10 * self.ttl}
+        self.save()
+
+    def save(self) -> None:
+        """Atomic rename, like rofi_menu.Store"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+
+def prober_running(path: str = PROBE_PATH) -> bool:
+    try:
+        return time.time() - os.path.getmtime(f"{path}.running") < MAX_PROBE_RUN
+    except OSError:
+        return False
+
+
+def probe_in_background(targets: List[Target], cache: ProbeCache) -> bool:
+    """
+    Starts a detached prober for the targets without a fresh result,
+    returns immediately (True if one was started)
+    """
+    stale = cache.stale(targets)
+    if not stale or prober_running(cache.path):
+        return False
+    targets_path = f"{cache.path}.targets"
+    os.makedirs(os.path.dirname(targets_path), exist_ok=True)
+    with open(targets_path, 'w') as f:  # a pipe could block on thousands of hosts
+        json.dump(stale, f)
+    with open(f"{cache.path}.running", 'w'):
+        pass
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--probe", targets_path, cache.path],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,  # outlives the menu script
+    )
+    return True
+
+
+def run_prober(targets_path: str, cache_path: str) -> None:
+    """--probe: probes the stored targets and merges the results into the cache"""
+    try:
+        with open(targets_path) as f:
+            targets = [(hostname, int(port)) for hostname, port in json.load(f)]
+        latencies = asyncio.run(probe_all(targets))
+        ProbeCache(cache_path).update(latencies)  # re-read, merges with other writers
+    finally:
+        if os.path.exists(f"{cache_path}.running"):
+            os.unlink(f"{cache_path}.running")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--probe"]:
+        run_prober(sys.argv[2], sys.argv[3])
+    else:
+        targets = [(arg.rsplit(":", 1)[0], int(arg.rsplit(":", 1)[1])) for arg in sys.argv[1:]]
+        for key, latency in asyncio.run(probe_all(targets)).items():
+            print(f"{key:<40} {'down' if latency is None else f'{latency:.1f} ms'}")
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 from typing import List
-import tomllib
 import os
 import sys
 
 sys.path.append("/home/truepeak/.config/rofi")
+sys.path.append("/home/truepeak/.config/rofi/menus/ssh")
 import rofi_menu
+from ssh_index import parse_inventory
 
 USER_HOME = f"/home/{os.getlogin()}"
 SSH_CONFIG_PATH = f"{USER_HOME}/.ssh/rofi_menu.toml"
@@ -31,16 +32,16 @@ class SSHEntry(rofi_menu.Item):
 
 
 def parse_config() -> List[SSHEntry]:
-    with open(SSH_CONFIG_PATH, "rb") as f:
-        config = tomllib.load(f)
-    entries = config.get("ssh")
-    entries = [SSHEntry(entry_config=e) for e in entries]
-    return entries
+    entries = rofi_menu.FileCache(SSH_CONFIG_PATH, parse_inventory).load()
+    return [SSHEntry(entry_config=e) for e in entries]
 
-if __name__ == "__main__":
+def build_menu() -> rofi_menu.Menu:
     items: List[rofi_menu.Item] = [
         rofi_menu.ExitItem(),
     ]
     items.extend(parse_config())
-    main_menu = rofi_menu.Menu(items=items, message="󰌘  SSH MANAGER")
-    rofi_menu.run_menu(main_menu)
+    return rofi_menu.Menu(items=items, message="󰌘  SSH MANAGER")
+
+
+if __name__ == "__main__":
+    rofi_menu.run_menu(build_menu)
@@ -1,6 +1,9 @@
 from .models3 import Menu, Item, ExitItem, SubMenuItem, ReturnItem, WaitItem, ToggleItem
 from .definitions import *
+from .store import Store, MarshalStore, Snapshot
+from .cache import FileCache
 from .main import run_menu
+from .daemon import run_menu_daemon
 from .utils import run_cmd, get_process_elapsed_time
 
 VERSION = (0, 1, 0)
\ No newline at end of file
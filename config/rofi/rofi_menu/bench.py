@@ -0,0 +1,115 @@
+"""
+Micro benchmarks
+Run from the rofi config dir: python -m rofi_menu.bench
+"""
+import os
+import tempfile
+import time
+import tomllib
+
+from typing import Callable, Dict, Any
+
+from .cache import FileCache
+from .store import Store, MarshalStore
+
+ITEM_COUNTS = (10, 100, 1000, 10000)
+HOST_COUNTS = (10, 100, 1000, 5000)
+REPEAT = 20
+
+
+def timeit(func: Callable[[], Any], repeat: int = REPEAT) -> float:
+    """Returns best time of 'repeat' runs in ms"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def make_item_data(count: int) -> Dict[str, Dict[str, Any]]:
+    """Data shaped like Item.save_data output"""
+    return {
+        f"main-{i}": {"text": f"󰋋  Device {i}", "id": None, "status": bool(i % 2), "cooldown": 0}
+        for i in range(count)
+    }
+
+
+def bench_store() -> None:
+    print(f"{'backend':<14}{'items':>8}{'full save':>12}{'1 changed':>12}{'load':>10}{'load+save':>11}  (ms)")
+    for backend in (Store, MarshalStore):
+        for count in ITEM_COUNTS:
+            with tempfile.TemporaryDirectory() as tmp:
+                store = backend(os.path.join(tmp, "session"))
+                store.data = make_item_data(count)
+                full = timeit(lambda: (os.path.exists(store.path) and os.unlink(store.path), store.save()))
+
+                def save_one_changed():
+                    store.data["main-0"]["cooldown"] += 1
+                    store.save()
+
+                store.save()
+                partial = timeit(save_one_changed)
+                load = timeit(store.load)
+
+                def load_change_save():
+                    # a selection: fresh store, replay, change one item, save
+                    fresh = backend(store.path)
+                    fresh.load()
+                    fresh.data["main-0"]["cooldown"] += 1
+                    fresh.save()
+                    return fresh.data["main-0"]["cooldown"]
+
+                load_save = timeit(load_change_save)
+                expected = load_change_save()
+                store.load()
+                assert store.data["main-0"]["cooldown"] == expected, f"{backend.__name__} lost a change"
+            print(f"{backend.__name__:<14}{count:>8}{full:>12.3f}{partial:>12.3f}{load:>10.3f}{load_save:>11.3f}")
+
+
+def make_inventory(count: int) -> str:
+    """rofi_menu.toml of the SSH menu with 'count' hosts"""
+    return "".join(
+        f'[[ssh]]\nidentifier = "host-{i}"\nusername = "user"\nhostname = "10.0.{i // 256}.{i % 256}"\n'
+        f'port = 22\nssh_key = "~/.ssh/id_ed25519"\n\n'
+        for i in range(count)
+    )
+
+
+def load_hosts(raw: bytes) -> list:
+    """[[ssh]] tables as plain dicts, the kind of loader a menu hands to FileCache"""
+    return [
+        {key: int(e[key]) if key == "port" else str(e[key])
+         for key in ("identifier", "username", "hostname", "port", "ssh_key")}
+        for e in tomllib.loads(raw.decode()).get("ssh", [])
+    ]
+
+
+def bench_file_cache() -> None:
+    print(f"{'hosts':>8}{'no cache':>12}{'cold':>12}{'touched':>12}{'warm':>10}  (ms)")
+    for count in HOST_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "rofi_menu.toml")
+            with open(source, 'w') as f:
+                f.write(make_inventory(count))
+            cache = FileCache(source, load_hosts)
+
+            def read_source():
+                with open(source, 'rb') as f:
+                    return load_hosts(f.read())
+
+            def touched():
+                os.utime(source)
+                cache.load()
+
+            uncached = timeit(read_source)
+            cold = timeit(lambda: (cache.clear(), cache.load()))
+            hashed = timeit(touched)
+            warm = timeit(cache.load)
+        print(f"{count:>8}{uncached:>12.3f}{cold:>12.3f}{hashed:>12.3f}{warm:>10.3f}")
+
+
+if __name__ == "__main__":
+    bench_store()
+    print()
+    bench_file_cache()
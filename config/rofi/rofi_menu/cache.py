@@ -0,0 +1,86 @@
+"""
+Compiled cache of parsed source files (ex. a TOML inventory)
+The parsed value is marshalled next to the source and keyed by the source's
+(mtime, size) and content hash: an untouched source is not even read, a
+touched but identical one is read and hashed but not parsed again
+"""
+import hashlib
+import inspect
+import marshal
+import os
+
+from typing import Any, Callable
+
+CACHE_VERSION = 1
+
+
+class FileCache:
+    """
+    Parsed value of one source file
+    'loader' turns the raw bytes into marshallable data (dicts, lists, str, int...),
+    the cache is dropped whenever the loader's module changes
+    """
+
+    def __init__(self, source: str, loader: Callable[[bytes], Any], path: str = None):
+        self.source = source
+        self.loader = loader
+        if path is None:
+            directory, name = os.path.split(source)
+            path = os.path.join(directory, f".{name}.cache")
+        self.path = path
+        self._schema = None
+
+    @property
+    def schema(self) -> str:
+        if self._schema is None:
+            schema = hashlib.sha1(f"{CACHE_VERSION}:{getattr(self.loader, '__qualname__', '')}".encode())
+            try:
+                with open(inspect.getsourcefile(self.loader), 'rb') as f:
+                    schema.update(f.read())
+            except (TypeError, OSError):  # builtins etc. -> version and name only
+                pass
+            self._schema = schema.hexdigest()
+        return self._schema
+
+    def load(self) -> Any:
+        """Parsed source, loader errors and a missing source propagate as without the cache"""
+        stat = os.stat(self.source)
+        key = [stat.st_mtime_ns, stat.st_size]
+        cached = self._read()
+        if cached is not None and cached[1] == key:
+            return cached[3]
+
+        with open(self.source, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if cached is not None and cached[2] == digest:
+            value = cached[3]
+        else:
+            value = self.loader(raw)
+        self._write([self.schema, key, digest, value])
+        return value
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _read(self) -> list | None:
+        """[schema, key, digest, value], None if missing, corrupt or from another loader"""
+        try:
+            with open(self.path, 'rb') as f:
+                cached = marshal.loads(f.read())  # much faster than marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(cached, list) or len(cached) != 4 or cached[0] != self.schema:
+            return None
+        return cached
+
+    def _write(self, cached: list) -> None:
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(marshal.dumps(cached))
+            os.replace(tmp_path, self.path)
+        except (OSError, ValueError):  # read-only directory or unmarshallable value, parse every time
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
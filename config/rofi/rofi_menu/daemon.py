@@ -0,0 +1,159 @@
+"""
+Resident menu server
+Keeps the menu tree in memory between rofi script calls, the script itself
+only forwards ROFI_* variables over a Unix socket (rofi_menu_client) and
+prints the reply. Every new rofi session (ROFI_RETV=0) gets a freshly built
+tree, selections run against the resident one.
+Errors are logged to <menu name>.log next to the socket
+"""
+import io
+import json
+import os
+import socket
+import sys
+import traceback
+from contextlib import redirect_stdout
+from typing import Callable, Dict, Optional
+
+from rofi_menu_client import ROFI_ENV, get_socket_path, recv_all, request, script_name
+
+from .models3 import Menu
+from .main import run_menu, dispatch
+
+
+def log_error(context: str) -> None:
+    """Current exception with traceback to stderr, the daemon's log file"""
+    print(f"rofi_menu daemon: {context}", file=sys.stderr)
+    traceback.print_exc(file=sys.stderr)
+    sys.stderr.flush()
+
+
+def handle(menu: Menu, env: Dict[str, Optional[str]]) -> str:
+    """Runs one script call against the resident menu, returns what it printed"""
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        try:
+            dispatch(menu, env.get("ROFI_RETV") or "0", env.get("ROFI_INFO") or "")
+        except SystemExit:  # ExitItem -> rofi closes, daemon stays
+            pass
+        except Exception:  # keep serving, the client just gets an empty menu
+            log_error(f"ROFI_RETV={env.get('ROFI_RETV')} ROFI_INFO={env.get('ROFI_INFO')!r} failed")
+    return buffer.getvalue()
+
+
+def build_menu(menu_factory: Callable[[], Menu]) -> Menu:
+    menu = menu_factory()
+    menu.set_item_data()
+    return menu
+
+
+def serve(menu_factory: Callable[[], Menu], menu: Menu, sock: socket.socket, idle_timeout: float) -> None:
+    """
+    Serves requests until no script call arrives for 'idle_timeout' seconds
+    'menu' is the tree built at startup, it serves the first rofi session
+    """
+    fresh = True
+    sock.settimeout(idle_timeout)
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except socket.timeout:
+            return
+        with conn:
+            conn.settimeout(None)
+            try:
+                env = json.loads(recv_all(conn) or b"{}")
+                if (env.get("ROFI_RETV") or "0") == "0" and not fresh:  # new session -> current state
+                    try:
+                        menu = build_menu(menu_factory)
+                    except Exception:  # keep serving the previous tree
+                        log_error("rebuilding the menu failed")
+                fresh = False
+                conn.sendall(handle(menu, env).encode())
+            except (OSError, ValueError):
+                continue
+
+
+def spawn_daemon(menu_factory: Callable[[], Menu], socket_path: str, idle_timeout: float) -> bool:
+    """
+    Double-forks a detached server process
+    Returns after the menu is built and the socket accepts connections
+    """
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid:
+        os.close(ready_w)
+        with os.fdopen(ready_r, "rb") as ready:
+            ok = ready.read() == b"1"
+        os.waitpid(pid, 0)
+        return ok
+
+    # --- intermediate child ---
+    os.close(ready_r)
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+
+    # --- daemon ---
+    # rofi waits for EOF on the script stdout, so the daemon must not hold it
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    try:  # one log per daemon run, it's private_dir()/<name>.log
+        log = os.open(f"{os.path.splitext(socket_path)[0]}.log", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(log, 2)
+        os.close(log)
+    except OSError:
+        pass
+
+    try:
+        menu = build_menu(menu_factory)
+
+        if os.path.exists(socket_path):  # client could not connect -> stale socket
+            os.unlink(socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(socket_path)
+        sock.listen(4)
+    except Exception:
+        log_error("startup failed")
+        os._exit(1)
+
+    os.write(ready_w, b"1")
+    os.close(ready_w)
+    try:
+        serve(menu_factory, menu, sock, idle_timeout)
+    finally:
+        sock.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os._exit(0)
+
+
+def run_menu_daemon(menu_factory: Callable[[], Menu], name: str = None, idle_timeout: float = 300) -> None:
+    """
+    Daemon variant of run_menu
+    First call spawns a server which builds the menu via 'menu_factory',
+    following calls only forward ROFI_RETV/ROFI_INFO/ROFI_DATA to it
+    (call rofi_menu_client.forward first to skip the rofi_menu import).
+    Set ROFI_MENU_NO_DAEMON=1 to run everything in-process.
+    """
+    if os.environ.get("ROFI_MENU_NO_DAEMON"):
+        run_menu(menu_factory)
+        return
+
+    try:
+        socket_path = get_socket_path(name or script_name())
+    except OSError:  # no private directory for the socket
+        run_menu(menu_factory)
+        return
+    env = {key: os.environ.get(key) for key in ROFI_ENV}
+
+    output = request(socket_path, env)
+    if output is None and spawn_daemon(menu_factory, socket_path, idle_timeout):
+        output = request(socket_path, env)
+
+    if output is None:  # daemon could not start
+        run_menu(menu_factory)
+        return
+
+    sys.stdout.write(output)
@@ -1,5 +1,7 @@
 from .models3 import *
+from .store import Snapshot
 import os
+from typing import Callable
 
 menu = Menu(
     items=[
@@ -10,17 +12,56 @@ menu = Menu(
 )
 
 
-def run_menu(menu: Menu) -> None:
+def dispatch(menu: Menu, rofi_retv: str, rofi_info: str) -> None:
+    """Renders the menu or applies the selection according to ROFI_RETV"""
+    if rofi_retv == "0":
+        menu.render_menu()
+    if rofi_retv == "1":
+        menu.apply_select(item_id=rofi_info)
+
+
+def load_menu(menu: Menu, rofi_retv: str) -> Menu:
+    """
+    Binds item ids, a selection additionally replays the session store
+    A new rofi session (ROFI_RETV=0) starts from fresh item state
+    """
+    if rofi_retv == "1":
+        try:
+            menu.store.load()
+        except (OSError, ValueError):
+            pass
+    menu.set_item_data()
+    return menu
+
+
+def run_menu(menu: Menu | Callable[[], Menu], snapshot_path: str = None) -> None:
+    """
+    menu: Menu instance or factory (ex. the Menu subclass)
+    With a factory the item tree is pickled after every call and restored on
+    the next selection without running item constructors, it is rebuilt only
+    for a new rofi session or when the code behind the menu changed
+    """
     rofi_retv = os.environ.get("ROFI_RETV", "0")
     rofi_info = os.environ.get("ROFI_INFO", "")
     rofi_data = os.environ.get("ROFI_DATA", None)
 
-    menu.set_item_data()
+    if isinstance(menu, Menu):
+        load_menu(menu, rofi_retv)
+        dispatch(menu, rofi_retv, rofi_info)
+        if rofi_retv == "0":
+            menu.save_item_data()
+        return
 
-    if rofi_retv == "0":
-        menu.render_menu()
-    if rofi_retv == "1":
-        menu.apply_select(item_id=rofi_info)
+    snapshot = Snapshot.for_factory(menu, snapshot_path)
+    restored = snapshot.load() if rofi_retv == "1" else None
+    menu = restored or load_menu(menu(), rofi_retv)
+
+    try:
+        dispatch(menu, rofi_retv, rofi_info)
+    finally:  # exit(0) from ExitItem ends the session
+        if rofi_retv == "0":
+            menu.save_item_data()
+        snapshot.save(menu)
 
 
 if __name__ == "__main__":
@@ -5,31 +5,11 @@ import sys, os
 from .definitions import *
 from .rofi import *
 from .utils import run_cmd, get_process_elapsed_time
+from .store import Store, default_store_path
 
 from typing import List, Dict, Any
 
 
-class Store:
-    """
-    Stores session state data between script calls
-    Data are stored in JSON format in /tmp
-    """
-
-    def __init__(self, path: str):
-        self.path = path
-        self.data = {}
-
-    def load(self):
-        """Loads data from JSON file"""
-        with open(self.path) as f:
-            self.data = json.load(f)
-
-    def save(self):
-        """Saves data to JSON file"""
-        with open(self.path, 'w') as f:
-            json.dump(self.data, f)
-
-
 class Menu:
     """Main menu class"""
 
@@ -43,8 +23,8 @@ class Menu:
         self.flag_message = kwargs.get('message', None)
 
         # --- Store init ---
-        self.store_path = kwargs.get('store_path', "/tmp/rofi_menu_session.json")
-        self.store = Store(self.store_path)
+        self.store_path = kwargs.get('store_path') or default_store_path()  # per user and script
+        self.store: Store = kwargs.get('store_backend', Store)(self.store_path)
 
     def set_item_data(self) -> None:
         """Sets child item data from the session store"""
@@ -66,6 +46,7 @@ class Menu:
         """Saves child item data to the session store"""
         for item in self._items:
             item.save_data()
+        self.store.save()
 
     def get_rofi_metadata(self) -> List[str]:
         """Returns list of rofi control strings set in flags"""
@@ -75,15 +56,14 @@ class Menu:
         self.flag_force_selection is not None and headings.append(rofi_force_selection(self.flag_force_selection))
 
         # append session store path
-        headings.append(rofi_persist_data(self.store_path))
+        self.store_path and headings.append(rofi_persist_data(self.store_path))
 
         return headings
 
     def render_menu(self, **kwargs) -> None:
-        """Renders the menu from child items"""
+        """Renders the menu from child items (unchanged items reuse their cached row)"""
         result = self.get_rofi_metadata()
-        for i, item in enumerate(self._items):
-            result.append(item.render_item())
+        result.extend(item.render_row() for item in self._items)
 
         sys.stdout.write("\n".join(result))
 
@@ -114,11 +94,19 @@ class Item:
     """Basic menu item"""
 
     def __init__(self, **kwargs):
+        self._row_cache: str | None = None
         self.text = kwargs.get('text', '<undefined>')
         self.id = None
+        self.item_id = None
         self._parent_menu: Menu = None
         self._main_menu: Menu = None
 
+    def __setattr__(self, key, value):
+        # any public attribute may change the rendered row
+        if not key.startswith("_"):
+            object.__setattr__(self, "_row_cache", None)
+        object.__setattr__(self, key, value)
+
     def on_select(self, **kwargs):
         """Here goes the item code"""
         self.text = "<pressed>"  # sample driver code
@@ -128,12 +116,22 @@ class Item:
         """Returns rofi string"""
         return f"{self.text}\0info\x1f{self.item_id}"
 
+    def render_row(self) -> str:
+        """Cached render_item, recomputed only when the item is dirty"""
+        if self._row_cache is None:
+            self._row_cache = self.render_item()
+        return self._row_cache
+
+    def mark_dirty(self) -> None:
+        """Forces re-render, needed after in-place changes (ex. self.info['battery'] = 10)"""
+        self._row_cache = None
+
     def save_data(self):
         """
         Saves itself to main menu store for persistence between script calls
         (private attributes -> '_main_menu' etc. get ignored)
         """
-        self._main_menu.store.data[self.id] = {
+        self._main_menu.store.data[self.item_id] = {
             key: val for key, val in vars(self).items() if not key.startswith("_")
         }
 
@@ -192,17 +190,38 @@ class ToggleItem(Item):
 
 
 class SubMenuItem(Item):
-    """Used to create a (nested) submenu"""
+    """
+    Used to create a (nested) submenu
+    Children are passed either as 'items' or as 'items_factory' - a callable
+    which runs only when the submenu is entered, its result is then reused
+    """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._items = kwargs.get("items", [])
+        self._items_factory = kwargs.get("items_factory", None)
+        self._built_items: List[Item] | None = None if self._items_factory else kwargs.get("items", [])
 
         # --- Flags ---
         self.flag_keep_selection = kwargs.get("keep_selection", True)
         self.flag_force_selection = kwargs.get("default_selection", 0)
         self.flag_message = kwargs.get("message", None)
 
+    @property
+    def _items(self) -> List[Item]:
+        if self._built_items is None:
+            self._built_items = self._items_factory()
+            if self._main_menu is not None:  # ids are already known -> bind the new children
+                self.set_item_data()
+        return self._built_items
+
+    @_items.setter
+    def _items(self, items: List[Item]) -> None:
+        self._built_items = items
+
+    @property
+    def items_built(self) -> bool:
+        return self._built_items is not None
+
     def reload(self) -> None:
         """Reloads all child objets"""
         self.__init__()
@@ -216,15 +235,14 @@ class SubMenuItem(Item):
         self.flag_force_selection is not None and headings.append(rofi_force_selection(self.flag_force_selection))
 
         # append session store path
-        headings.append(rofi_persist_data(self._main_menu.store_path))
+        self._main_menu.store_path and headings.append(rofi_persist_data(self._main_menu.store_path))
 
         return headings
 
     def render_menu(self, wait: int = 0) -> None:
-        """Renders the menu from items"""
+        """Renders the menu from items (unchanged items reuse their cached row)"""
         result = self.get_rofi_metadata()
-        for i, item in enumerate(self._items):
-            result.append(item.render_item())
+        result.extend(item.render_row() for item in self._items)
 
         sys.stdout.write("\n".join(result))
 
@@ -261,6 +279,8 @@ class SubMenuItem(Item):
                 return SelectOutcome.SUBMENU
 
     def set_item_data(self):
+        if not self.items_built:  # done once the factory runs
+            return
         for i, item in enumerate(self._items):
             item.item_id = f"{self.item_id}-{i}"
             item._parent_menu = self
@@ -271,16 +291,21 @@ class SubMenuItem(Item):
             item.set_item_data()
 
     def save_data(self):
-        self._main_menu.store.data[self.id] = {
+        self._main_menu.store.data[self.item_id] = {
             key: val for key, val in vars(self).items() if not key.startswith("_")
         }
 
+        if not self.items_built:
+            return
         for item in self._items:
             item.save_data()
 
 
 class WaitItem(Item):
-    """Represents an wait item in menu"""
+    """
+    Represents an wait item in menu
+    Optional 'wait_for(timeout) -> bool' callback ends the wait as soon as it returns True
+    """
 
     def __init__(self, cooldown: int = 10, **kwargs):
         super().__init__(**kwargs)
@@ -289,6 +314,7 @@ class WaitItem(Item):
         self.default_cooldown = cooldown
         self.cooldown = 0
         self.clicker_pid = None
+        self._wait_for = kwargs.get("wait_for", None)
 
     def on_select(self, **kwargs):
         # force stop
@@ -306,7 +332,13 @@ class WaitItem(Item):
 
         if self.cooldown > 1:
             self.cooldown -= 1
-            pid, _ = run_cmd(['sh', '-c', 'sleep 0.5 && wtype -k Return'], background=True)
+            if self._wait_for is None:
+                pid, _ = run_cmd(['sh', '-c', 'sleep 0.5 && wtype -k Return'], background=True)
+            elif self._wait_for(0.5):  # finished during this tick
+                self.cooldown = 0
+                return SelectOutcome.RETURN
+            else:
+                pid, _ = run_cmd(['wtype', '-k', 'Return'], background=True)
             self.clicker_pid = pid
             return SelectOutcome.REFRESH
 
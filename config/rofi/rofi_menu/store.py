@@ -0,0 +1,217 @@
+"""
+Session store backends
+Store        - whole state as JSON (default)
+MarshalStore - append-only marshal log, writes only changed items
+Snapshot     - pickled item tree, restored without running item constructors
+"""
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import pickle
+import tempfile
+
+from typing import Dict, Any, Callable
+
+from rofi_menu_client import private_dir, script_name
+
+SNAPSHOT_VERSION = 1
+
+
+def default_store_path() -> str | None:
+    """Session store of the running menu script in the private rofi_menu directory, None without one"""
+    try:
+        return os.path.join(private_dir(), f"{script_name()}.session")
+    except OSError:
+        return None
+
+
+class Store:
+    """
+    Stores session state data between script calls
+    Data are stored in JSON format, without a path they only live in memory
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.data = {}
+
+    def load(self):
+        """Loads data from JSON file"""
+        if self.path is None:
+            return
+        with open(self.path) as f:
+            self.data = json.load(f)
+
+    def save(self):
+        """Saves data to JSON file (atomic rename, readers never see a half written file)"""
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+
+class MarshalStore(Store):
+    """
+    Compact store for menus with many items
+    Each save appends one length-prefixed marshal record containing only the
+    items whose data changed since the last save/load, the log is compacted
+    (rewritten and atomically renamed) once it holds too many stale records.
+    A save without a prior load rewrites the log as well: the previous
+    session's records would otherwise come back for every item not saved again
+    """
+
+    COMPACT_RATIO = 4  # rewrite when records > COMPACT_RATIO * items
+    HEADER_SIZE = 4
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._saved: Dict[str, bytes] = {}  # item id -> marshalled data as written
+        self._records = 0
+        self._torn = False
+        self._synced = False  # the file holds exactly _saved (after load or compaction)
+
+    def load(self):
+        """Replays the log, a torn last record (crash during append) is ignored"""
+        if self.path is None:
+            return
+        self.data, self._records = {}, 0
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+
+        offset = 0
+        while offset + self.HEADER_SIZE <= len(raw):
+            size = int.from_bytes(raw[offset:offset + self.HEADER_SIZE], "little")
+            offset += self.HEADER_SIZE
+            if offset + size > len(raw):
+                break
+            try:
+                record: Dict[str, Any] = marshal.loads(raw[offset:offset + size])
+            except (EOFError, ValueError, TypeError):
+                break
+            offset += size
+            self._records += 1
+            for key, val in record.items():
+                if val is None:
+                    self.data.pop(key, None)
+                else:
+                    self.data[key] = val
+
+        self._torn = offset < len(raw)  # appending after garbage would hide the new records
+        # encoded now: callers change self.data in place before the next save
+        self._saved = {key: marshal.dumps(val) for key, val in self.data.items()}
+        self._synced = True
+
+    def save(self):
+        """Appends changed items only"""
+        if self.path is None:
+            return
+        changed = {}
+        encoded = {}
+        for key, val in self.data.items():
+            encoded[key] = marshal.dumps(val)
+            if self._saved.get(key) != encoded[key]:
+                changed[key] = val
+        for key in self._saved.keys() - encoded.keys():  # removed items
+            changed[key] = None
+
+        if (not self._synced or self._torn or self._records + 1 > self.COMPACT_RATIO * max(len(self.data), 1)
+                or not os.path.exists(self.path)):
+            self._compact()
+        elif changed:
+            with open(self.path, 'ab') as f:
+                f.write(self._frame(changed))
+            self._records += 1
+
+        self._saved = encoded
+
+    def _compact(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._frame(self.data))
+        os.replace(tmp_path, self.path)
+        self._records = 1
+        self._torn = False
+        self._synced = True
+
+    def _frame(self, record: Dict[str, Any]) -> bytes:
+        raw = marshal.dumps(record)
+        return len(raw).to_bytes(self.HEADER_SIZE, "little") + raw
+
+
+class Snapshot:
+    """
+    Whole menu tree pickled between script calls
+    File = pickled (version, schema) header followed by the pickled menu,
+    the menu is only unpickled when the header matches. Unpickling runs code,
+    so the file lives in the private rofi_menu directory and is only loaded
+    when the current user owns it and nobody else can write to it
+    """
+
+    def __init__(self, path: str | None, schema: str):
+        self.path = path
+        self.schema = schema
+
+    @classmethod
+    def for_factory(cls, menu_factory: Callable, path: str = None) -> "Snapshot":
+        """Snapshot keyed by the factory, schema changes whenever its module or rofi_menu changes"""
+        sources = [os.path.join(os.path.dirname(__file__), "models3.py")]
+        try:
+            sources.append(inspect.getsourcefile(menu_factory))
+        except TypeError:  # builtins etc. -> rofi_menu only
+            pass
+        name = f"{sources[-1]}:{getattr(menu_factory, '__qualname__', repr(menu_factory))}"
+
+        schema = hashlib.sha1(f"{SNAPSHOT_VERSION}:{name}".encode())
+        for source in sources:
+            with open(source, 'rb') as f:
+                schema.update(f.read())
+
+        if path is None:
+            key = hashlib.sha1(name.encode()).hexdigest()[:12]
+            try:
+                path = os.path.join(private_dir(), f"{key}.snapshot")
+            except OSError:  # no safe place -> snapshots disabled
+                path = None
+        return cls(path, schema.hexdigest())
+
+    def load(self) -> Any:
+        """Returns the stored menu, None if missing, not private or built from a different schema"""
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+                    return None
+                if pickle.load(f) != (SNAPSHOT_VERSION, self.schema):
+                    return None
+                return pickle.load(f)
+        except Exception:  # missing, truncated or referencing removed classes
+            return None
+
+    def save(self, menu: Any) -> bool:
+        """Stores the menu, returns False if the tree is not picklable (ex. lambdas as callbacks) or unwritable"""
+        if self.path is None:
+            return False
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")  # O_EXCL, 0600
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((SNAPSHOT_VERSION, self.schema), f)
+                pickle.dump(menu, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except (pickle.PicklingError, TypeError, AttributeError, OSError):
+            os.unlink(tmp_path)
+            self.clear()
+            return False
+        return True
+
+    def clear(self) -> None:
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
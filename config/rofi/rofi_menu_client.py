@@ -0,0 +1,74 @@
+"""
+Client half of the rofi_menu daemon
+Only needs os/socket/json, so a menu script can forward its call before
+importing rofi_menu and its own dependencies:
+
+    import rofi_menu_client
+    if rofi_menu_client.forward():
+        sys.exit(0)
+    import rofi_menu ...
+"""
+import json
+import os
+import socket
+import sys
+
+ROFI_ENV = ("ROFI_RETV", "ROFI_INFO", "ROFI_DATA")
+
+
+def private_dir() -> str:
+    """
+    Per-user rofi_menu directory in $XDG_RUNTIME_DIR (~/.cache without it)
+    Refused if another user owns it or may write to it
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "rofi_menu")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stat = os.lstat(path)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o022 or not os.path.isdir(path):
+        raise PermissionError(f"{path} is not a private directory")
+    return path
+
+
+def get_socket_path(name: str) -> str:
+    """Returns per-user socket path for menu called 'name'"""
+    return os.path.join(private_dir(), f"{name}.sock")
+
+
+def script_name() -> str:
+    return os.path.splitext(os.path.basename(sys.argv[0]))[0]
+
+
+def request(socket_path: str, env: dict[str, str | None], timeout: float = 10) -> str | None:
+    """Sends rofi env to the daemon, returns rendered output (None if no daemon is running)"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(env).encode())
+            sock.shutdown(socket.SHUT_WR)
+            return recv_all(sock).decode()
+    except OSError:
+        return None
+
+
+def forward(name: str | None = None) -> bool:
+    """Hands the script call to a running daemon and prints its reply, False if none answered"""
+    if os.environ.get("ROFI_MENU_NO_DAEMON"):
+        return False
+    try:
+        socket_path = get_socket_path(name or script_name())
+    except OSError:
+        return False
+    output = request(socket_path, {key: os.environ.get(key) for key in ROFI_ENV})
+    if output is None:
+        return False
+    sys.stdout.write(output)
+    return True
+
+
+def recv_all(sock: socket.socket) -> bytes:
+    chunks = []
+    while chunk := sock.recv(65536):
+        chunks.append(chunk)
+    return b"".join(chunks)